@@ -15,14 +15,20 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import hashlib
+import http.cookiejar
 import logging
-from typing import Callable, Tuple, Union
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple, Union
 
 from rest_framework.authentication import BaseAuthentication
 from rest_framework import exceptions
 from rest_framework.request import HttpRequest
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.models import Response
 import xmltodict
 
@@ -35,27 +41,140 @@ logger: logging.Logger = logging.getLogger(__name__)
 # pylint: disable=E1136
 
 
+UserRole = Tuple[Union[str, None], Union[str, None]]
+
+
+class UserRoleCache:
+    """
+    Keeps the user and role of a token and GSAD_SID for ttl seconds and
+    unknown ones for negative_ttl seconds.
+
+    The least recently used entries are removed when there are more than
+    maxsize entries. Just a hash of token and GSAD_SID is kept.
+
+    >>> cache = UserRoleCache(ttl=60, negative_ttl=0, maxsize=1)
+    >>> cache.set(("token", "sid"), ("admin", "Admin"))
+    >>> cache.get(("token", "sid"))
+    ('admin', 'Admin')
+    >>> cache.set(("other", "sid"), (None, None))
+    >>> cache.get(("other", "sid")) is None
+    True
+    """
+
+    def __init__(self, ttl: int, negative_ttl: int, maxsize: int):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self.__entries: Dict[bytes, Tuple[float, UserRole]] = OrderedDict()
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def __key(key: Tuple[str, ...]) -> bytes:
+        digest = hashlib.blake2b(digest_size=16)
+        for value in key:
+            digest.update(str(value).encode())
+            digest.update(b"\0")
+        return digest.digest()
+
+    def get(self, key: Tuple[str, ...]) -> Optional[UserRole]:
+        key = self.__key(key)
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return None
+            expires, user_role = entry
+            if expires <= time.monotonic():
+                del self.__entries[key]
+                return None
+            self.__entries.move_to_end(key)
+            return user_role
+
+    def set(self, key: Tuple[str, ...], user_role: UserRole):
+        ttl = self.ttl if user_role[0] is not None else self.negative_ttl
+        if ttl <= 0:
+            return
+        key = self.__key(key)
+        with self.__lock:
+            self.__entries[key] = (time.monotonic() + ttl, user_role)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.maxsize:
+                self.__entries.popitem(last=False)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+
+user_role_cache = UserRoleCache(
+    settings.GSAD_CACHE_TTL,
+    settings.GSAD_CACHE_NEGATIVE_TTL,
+    settings.GSAD_CACHE_SIZE,
+)
+
+__session: Optional[requests.Session] = None  # pylint: disable=invalid-name
+
+
+def __gsad_get(url: str, **kwargs) -> Response:
+    """
+    gets url via a session keeping the connections to gsad alive.
+
+    The session does not keep cookies so that the GSAD_SID of a user is never
+    sent on behalf of another user.
+    """
+    global __session  # pylint: disable=global-statement,invalid-name
+    if __session is None:
+        session = requests.Session()
+        session.cookies.set_policy(
+            http.cookiejar.DefaultCookiePolicy(allowed_domains=[])
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=settings.GSAD_POOL_SIZE
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        __session = session
+    return __session.get(url, **kwargs)
+
+
 def __gsad_user_role(
     token: str, gsad_sid: str, *, gsad_url: str, get: Callable
-) -> Tuple[Union[str, None], Union[str, None]]:
+) -> UserRole:
     if not gsad_url:
         logger.warning("no gsad url")
         return None, None
+    key = (gsad_url, token, gsad_sid)
+    cached = user_role_cache.get(key)
+    if cached is not None:
+        return cached
     params = {"token": token, "cmd": "get_users"}
     cookies = dict(GSAD_SID=gsad_sid)
-    response: Response = get(gsad_url, params=params, cookies=cookies)
-    resp = xmltodict.parse(
-        response.text, attr_prefix="", cdata_key="text", dict_constructor=dict
-    ).get("envelope")
-    return resp.get("login"), resp.get("role")
+    response: Response = get(
+        gsad_url, params=params, cookies=cookies, timeout=settings.GSAD_TIMEOUT
+    )
+    resp = (
+        xmltodict.parse(
+            response.text,
+            attr_prefix="",
+            cdata_key="text",
+            dict_constructor=dict,
+        ).get("envelope")
+        or {}
+    )
+    user_role = resp.get("login"), resp.get("role")
+    user_role_cache.set(key, user_role)
+    return user_role
+
+
+# the user and role of a request are kept within META
+__REQUEST_KEY = "pheme.username_role"
 
 
 def get_username_role(
     request: HttpRequest,
     *,
     gsad_url: str = settings.GSAD_URL,
-    get: Callable = requests.get,
-) -> Tuple[Union[str, None], Union[str, None]]:
+    get: Callable = None,
+) -> UserRole:
     """
     returns a username and a role when it got found based on the request.
 
@@ -65,16 +184,28 @@ def get_username_role(
         gsad_url: str, when using gsad the url of gsad must be set, default is
             pheme.settings.GSAD_URL
         get: Callable, a lambda to get the user and tole. It must return a
-            requests.models.Response
+            requests.models.Response; default is a get of a session keeping
+            the connections to gsad alive.
+
+    The user and role are resolved once per request and are kept for
+    GSAD_CACHE_TTL seconds per token and GSAD_SID.
 
     Returns:
         A tuple either None, None or user, role
     """
+    meta = getattr(request, "META", None)
+    if isinstance(meta, dict) and __REQUEST_KEY in meta:
+        return meta[__REQUEST_KEY]
     gsad_sid = request.COOKIES.get("GSAD_SID")
     token = request.query_params.get("token")
+    user_role = None, None
     if token and gsad_sid:
-        return __gsad_user_role(token, gsad_sid, gsad_url=gsad_url, get=get)
-    return None, None
+        user_role = __gsad_user_role(
+            token, gsad_sid, gsad_url=gsad_url, get=get or __gsad_get
+        )
+    if isinstance(meta, dict):
+        meta[__REQUEST_KEY] = user_role
+    return user_role
 
 
 class SimpleApiKeyAuthentication(BaseAuthentication):
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# pheme/blob_store.py
+# Copyright (C) 2021 Greenbone Networks GmbH
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Stores uploaded images once per content within BLOB_STORE_PATH.
+
+A blob is identified by the hash of its content and the extension of its
+media type (e.g. 0123456789abcdef0123456789abcdef.png). Parameter contain a
+reference (pheme-blob:<id>) instead of the image itself:
+
+- WeasyPrint gets the image via the url_fetcher of a PDF render
+- html reports contain the image as data link so that a downloaded report
+  is self-contained or, when BLOB_BASE_URL is set, the absolute url of the
+  blob view which can be cached by a browser since a blob never changes
+
+Uploaded images are normalized (see pheme.images) before they are stored. To
+not normalize the same upload again the hash of an upload is linked to the
+stored blob via an upload file (<hash>.upload) containing the blob id.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+
+from pheme import images, settings
+
+BLOB_SCHEME = "pheme-blob"
+UPLOAD_SUFFIX = ".upload"
+__ID = re.compile(r"^[0-9a-f]{32}\.[a-z0-9]+$")
+
+
+def __path(blob_id: str) -> Optional[Path]:
+    if not __ID.match(blob_id):
+        return None
+    return Path(settings.BLOB_STORE_PATH).joinpath(blob_id)
+
+
+def __write(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp")
+    try:
+        with open(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def put(data: bytes, mime_type: str) -> str:
+    """
+    stores data when it is not already stored and returns its reference.
+    """
+    extension = (mimetypes.guess_extension(mime_type) or ".bin").lstrip(".")
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    blob_id = "{}.{}".format(digest, extension)
+    path = __path(blob_id)
+    if not path.exists():
+        __write(path, data)
+    return reference(blob_id)
+
+
+def put_image(data: bytes, mime_type: str) -> str:
+    """
+    stores the normalized image of an upload and returns its reference.
+
+    An upload is just normalized once per normalization settings; the same
+    upload returns the reference of the already stored image.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(
+        "{}:{}:{}:".format(
+            mime_type, settings.IMAGE_MAX_SIZE, settings.IMAGE_JPEG_QUALITY
+        ).encode()
+    )
+    digest.update(data)
+    upload = Path(settings.BLOB_STORE_PATH).joinpath(
+        digest.hexdigest() + UPLOAD_SUFFIX
+    )
+    try:
+        blob_id = upload.read_text()
+        if path_of(blob_id) is not None:
+            return reference(blob_id)
+    except FileNotFoundError:
+        pass
+    value = put(*images.normalize(data, mime_type))
+    __write(upload, blob_id_of(value).encode())
+    return value
+
+
+def reference(blob_id: str) -> str:
+    """
+    >>> reference("0123456789abcdef0123456789abcdef.png")
+    'pheme-blob:0123456789abcdef0123456789abcdef.png'
+    """
+    return "{}:{}".format(BLOB_SCHEME, blob_id)
+
+
+def blob_id_of(value) -> Optional[str]:
+    """
+    returns the blob id of a reference or None when value is not a
+    reference.
+
+    >>> blob_id_of("pheme-blob:0123456789abcdef0123456789abcdef.png")
+    '0123456789abcdef0123456789abcdef.png'
+    >>> blob_id_of("data:image/png;base64,AAAA") is None
+    True
+    """
+    if isinstance(value, str) and value.startswith(BLOB_SCHEME + ":"):
+        return value[len(BLOB_SCHEME) + 1 :]
+    return None
+
+
+def path_of(blob_id: str) -> Optional[Path]:
+    """
+    returns the path of a stored blob or None when it does not exist.
+    """
+    path = __path(blob_id)
+    return path if path is not None and path.exists() else None
+
+
+def mime_type_of(blob_id: str) -> str:
+    mime_type, _ = mimetypes.guess_type(blob_id)
+    return mime_type or "application/octet-stream"
+
+
+def fetch(url: str) -> Optional[Dict]:
+    """
+    returns the url_fetcher result of a blob reference or None when url is
+    not a reference to a stored blob.
+    """
+    blob_id = blob_id_of(url)
+    path = path_of(blob_id) if blob_id else None
+    if path is None:
+        return None
+    return {"string": path.read_bytes(), "mime_type": mime_type_of(blob_id)}
@@ -19,3 +19,21 @@ class TemplateNotFoundError(Exception):
     """
     Is used when a template is not available within parameter of pheme.
     """
+
+
+class PDFRenderingError(Exception):
+    """
+    Is used when a PDF cannot be rendered.
+    """
+
+
+class PDFRenderingQueueFullError(PDFRenderingError):
+    """
+    Is used when the rendering queue stays full for PDF_QUEUE_TIMEOUT.
+    """
+
+
+class PDFRenderingTimeoutError(PDFRenderingError):
+    """
+    Is used when a PDF is not rendered within PDF_TIMEOUT.
+    """
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# pheme/images.py
+# Copyright (C) 2021 Greenbone Networks GmbH
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Normalizes uploaded images so that the size of a rendered report does not
+depend on the resolution of an uploaded image.
+
+A raster image is
+
+- rotated according to its exif orientation
+- downscaled to fit into IMAGE_MAX_SIZE x IMAGE_MAX_SIZE pixel
+- recompressed as jpeg (IMAGE_JPEG_QUALITY) when it is a jpeg, otherwise as
+  optimized png; metadata are not kept
+
+The uploaded image is kept when it does not need to be downscaled and the
+recompressed one is not smaller. Vector images (svg) are kept as they are.
+"""
+import io
+import logging
+from typing import Tuple
+
+from PIL import Image, ImageOps
+
+from pheme import settings
+
+# Image.Resampling exists since Pillow 9.1
+LANCZOS = getattr(Image, "Resampling", Image).LANCZOS
+
+logger = logging.getLogger(__name__)
+
+RASTER_MIME_TYPES = {
+    "image/png",
+    "image/jpeg",
+    "image/gif",
+    "image/bmp",
+    "image/tiff",
+    "image/webp",
+}
+
+
+def __has_alpha(image) -> bool:
+    return image.mode in ("RGBA", "LA", "PA") or (
+        image.mode == "P" and "transparency" in image.info
+    )
+
+
+def __encode(image, as_jpeg: bool) -> Tuple[bytes, str]:
+    output = io.BytesIO()
+    if as_jpeg:
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(
+            output,
+            "JPEG",
+            quality=settings.IMAGE_JPEG_QUALITY,
+            optimize=True,
+            progressive=True,
+        )
+        return output.getvalue(), "image/jpeg"
+    if image.mode not in ("1", "L", "LA", "P", "RGB", "RGBA"):
+        image = image.convert("RGBA" if __has_alpha(image) else "RGB")
+    image.save(output, "PNG", optimize=True)
+    return output.getvalue(), "image/png"
+
+
+def normalize(data: bytes, mime_type: str) -> Tuple[bytes, str]:
+    """
+    returns the normalized image and its mime type.
+
+    Raises ValueError when data is not a readable image.
+    """
+    if mime_type not in RASTER_MIME_TYPES:
+        return data, mime_type
+    max_size = settings.IMAGE_MAX_SIZE
+    try:
+        image = Image.open(io.BytesIO(data))
+        as_jpeg = image.format == "JPEG"
+        downscaled = max(image.size) > max_size
+        # decodes a jpeg directly within a smaller scale when possible
+        image.draft(image.mode, (max_size, max_size))
+        image.load()
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError("Unable to read uploaded image") from e
+    # the orientation is lost with the metadata of a recompressed image
+    image = ImageOps.exif_transpose(image)
+    if downscaled:
+        image.thumbnail((max_size, max_size), LANCZOS)
+    normalized, normalized_type = __encode(image, as_jpeg)
+    if not downscaled and len(normalized) >= len(data):
+        return data, mime_type
+    logger.info(
+        "normalized %s of %d bytes to %s %s of %d bytes",
+        mime_type,
+        len(data),
+        normalized_type,
+        image.size,
+        len(normalized),
+    )
+    return normalized, normalized_type
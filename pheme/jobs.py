@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# pheme/jobs.py
+# Copyright (C) 2021 Greenbone Networks GmbH
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Runs long running tasks (e.g. transforming a report) in a local thread pool.
+
+The state of a job is kept within storage so that every process sharing the
+same cache is able to report it. A state contains:
+
+- status: queued, running, done or failed
+- progress: 0 to 100
+- name: the name of the stored result when done
+- error: the error message when failed
+"""
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from pheme import settings
+from pheme.storage import load, store
+
+logger = logging.getLogger(__name__)
+
+__executor = None  # pylint: disable=invalid-name
+
+
+def __default_executor() -> Executor:
+    global __executor  # pylint: disable=global-statement,invalid-name
+    if __executor is None:
+        __executor = ThreadPoolExecutor(
+            max_workers=settings.JOB_WORKERS, thread_name_prefix="pheme-job"
+        )
+    return __executor
+
+
+def _update(job_id: str, **kwargs) -> Dict:
+    updated = {**(load(job_id) or {}), **kwargs}
+    store(job_id, updated, id_generator=str)
+    return updated
+
+
+class Progress:
+    """
+    Is handed to a job to report its progress in percent.
+
+    The state is just updated when the progress changes by at least one
+    percent to not write the state on each call.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.percent = 0
+
+    def __call__(self, percent: float):
+        percent = min(int(percent), 99)
+        if percent > self.percent:
+            self.percent = percent
+            _update(self.job_id, progress=percent)
+
+
+def __run(job_id: str, func: Callable[..., str], *args):
+    _update(job_id, status="running")
+    try:
+        name = func(Progress(job_id), *args)
+    except Exception as e:  # pylint: disable=broad-except
+        logger.exception("job %s failed", job_id)
+        _update(job_id, status="failed", error=str(e))
+    else:
+        _update(job_id, status="done", progress=100, name=name)
+
+
+def submit(
+    prefix: str,
+    func: Callable[..., str],
+    *args,
+    executor: Optional[Executor] = None,
+) -> str:
+    """
+    runs func(progress, *args) within executor and returns the job id.
+
+    func gets a Progress as a first argument and must return the name of the
+    stored result.
+    """
+    job_id = store(
+        "{}-job".format(prefix),
+        {"status": "queued", "progress": 0, "name": None},
+    )
+    (executor or __default_executor()).submit(__run, job_id, func, *args)
+    return job_id
+
+
+def state(job_id: str) -> Optional[Dict]:
+    """
+    returns the state of a job or None when the job is unknown.
+    """
+    return load(job_id)
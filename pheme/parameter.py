@@ -17,7 +17,8 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import mimetypes
 import logging
-from typing import Dict, Callable
+import os
+from typing import Callable, Dict, Optional, Tuple
 from pathlib import Path
 import json
 import rest_framework
@@ -30,8 +31,9 @@ from rest_framework.decorators import (
 )
 from rest_framework.request import HttpRequest
 from rest_framework.response import Response
-from pheme.datalink import as_datalink
-from pheme import settings
+from pheme import blob_store, settings
+from pheme.parameter_store import USER_SPECIFIC, ParameterStore
+from pheme.render_cache import render_cache
 import pheme.authentication
 
 
@@ -52,6 +54,83 @@ def __load_params(from_path: str) -> Dict:
     )
 
 
+# path -> (stat key, parameter)
+__cached_params: Dict[str, Tuple[Tuple, Dict]] = {}
+
+
+def __stat_key(from_path: str) -> Optional[Tuple]:
+    try:
+        stat = os.stat(from_path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def __load_cached_params(from_path: str) -> Dict:
+    """
+    returns the parameter of from_path and just reads the file again when
+    its inode, mtime or size changed.
+
+    The returned dict is shared between callers and must not be modified.
+    """
+    from_path = str(from_path)
+    key = __stat_key(from_path)
+    cached = __cached_params.get(from_path)
+    if cached and cached[0] == key:
+        return cached[1]
+    params = __load_params(from_path) if key else {}
+    __cached_params[from_path] = (key, params)
+    return params
+
+
+def invalidate_params(from_path: str = None):
+    """
+    removes the cached parameter of from_path or all cached parameter when
+    from_path is not set.
+
+    Is called after parameter are written via pheme; changes made outside of
+    pheme are detected by their changed mtime or size.
+    """
+    if from_path is None:
+        __cached_params.clear()
+    else:
+        __cached_params.pop(str(from_path), None)
+
+
+# path of a parameter store -> parameter store
+__stores: Dict[str, ParameterStore] = {}
+
+
+def __store_of(from_path: str) -> ParameterStore:
+    """
+    returns the parameter store of a parameter file; the parameter are
+    stored per key within the directory next to the file (e.g. parameter.d
+    for parameter.json).
+
+    The parameter of the file are still loaded and overridden by the stored
+    ones.
+    """
+    path = str(Path(from_path).with_suffix(".d"))
+    store = __stores.get(path)
+    if store is None:
+        store = __stores.setdefault(path, ParameterStore(path))
+    return store
+
+
+def __system_params(from_path: str) -> Dict:
+    params = __load_cached_params(from_path)
+    stored = __store_of(from_path).load()
+    if not stored:
+        return params
+    merged = {**params, **stored}
+    if USER_SPECIFIC in stored:
+        merged[USER_SPECIFIC] = {
+            **params.get(USER_SPECIFIC, {}),
+            **stored[USER_SPECIFIC],
+        }
+    return merged
+
+
 def load_params(
     system_parameter_path: str = settings.PARAMETER_FILE_ADDRESS,
     default_parameter_path: str = settings.DEFAULT_PARAMETER_ADDRESS,
@@ -62,37 +141,43 @@ def load_params(
 
     A system parameter is set and handled by an individual system while default
     parameter usually come from data-objects.
+
+    The files are just read again when they changed; the values of the
+    returned dict are shared and must not be modified.
     """
     return {
-        **__load_params(default_parameter_path),
-        **__load_params(system_parameter_path),
+        **__load_cached_params(default_parameter_path),
+        **__system_params(system_parameter_path),
     }
 
 
-def __store(params: Dict, *, from_path: str = None) -> Dict:
-    Path(from_path).write_text(json.dumps(params))
-    return params
-
-
 def __put(
     request: HttpRequest,
     func: Callable[[HttpRequest, Dict], Dict],
     *,
     from_path: str = settings.PARAMETER_FILE_ADDRESS,
-    store: Callable[[Dict, str], Dict] = __store,
 ) -> Response:
-    params = __load_params(from_path=from_path)
+    """
+    applies func to the parameter of the system or, when the request is
+    made by a user, to the parameter of the user.
+
+    func is applied on an empty dict so that just the changed parameter are
+    written.
+    """
+    store = __store_of(from_path)
+    changes = func(request, {})
     username = request.META.get("GVM_USERNAME")
-    if username:
-        all_user = params.get("user_specific", {})
-        specific_user_params = all_user.get(username, {})
-        specific_user_params = func(request, specific_user_params)
-        all_user[username] = specific_user_params
-        params["user_specific"] = all_user
-        value = params
-    else:
-        value = func(request, params)
-    return Response(store(value, from_path=from_path))
+    try:
+        if username:
+            params = __load_cached_params(from_path)
+            base = params.get(USER_SPECIFIC, {}).get(username)
+            store.put_user(username, changes, base)
+        else:
+            store.put(changes)
+    finally:
+        invalidate_params(from_path)
+        render_cache.invalidate()
+    return Response(__system_params(from_path))
 
 
 def __process_form_data(request: HttpRequest, data: Dict) -> Dict:
@@ -109,7 +194,7 @@ def __process_form_data(request: HttpRequest, data: Dict) -> Dict:
                 "uploading filetype %s/%s for %s", file_type, value.name, key
             )
             if file_type and file_type.startswith("image"):
-                data[key] = as_datalink(value.read(), file_type)
+                data[key] = blob_store.put_image(value.read(), file_type)
             elif file_type and file_type.startswith("text"):
                 data[key] = value.read().decode()
             else:
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+# pheme/parameter_store.py
+# Copyright (C) 2021 Greenbone Networks GmbH
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Stores each parameter in a json file of its own so that writing a parameter
+just writes its value instead of all parameter.
+
+The parameter of a user (user_specific) are stored within a file per user in
+user_specific/. A file is replaced atomically by renaming a written temporary
+file; writers are serialized by a file lock so that concurrent processes do
+not lose updates of a user.
+
+After each write the generation within .generation is increased; a reader
+just reads the files again when the generation changed.
+"""
+import fcntl
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+from urllib.parse import quote, unquote
+
+USER_SPECIFIC = "user_specific"
+GENERATION_FILE = ".generation"
+LOCK_FILE = ".lock"
+SUFFIX = ".json"
+
+
+def _write(path: Path, value):
+    """
+    writes value as json into a temporary file and renames it to path.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp")
+    try:
+        with open(fd, "w") as f:
+            json.dump(value, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _read(path: Path, default=None):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def __read_directory(path: Path) -> Dict:
+    """
+    reads each json file within path; the key is the unquoted file name.
+    """
+    values = {}
+    try:
+        entries = list(os.scandir(path))
+    except FileNotFoundError:
+        return values
+    missing = object()
+    for entry in entries:
+        if entry.is_file() and entry.name.endswith(SUFFIX):
+            value = _read(Path(entry.path), missing)
+            # may be removed in the meantime
+            if value is not missing:
+                values[unquote(entry.name[: -len(SUFFIX)])] = value
+    return values
+
+
+def _read_all(path: Path) -> Dict:
+    params = __read_directory(path)
+    users = __read_directory(path.joinpath(USER_SPECIFIC))
+    if users:
+        params[USER_SPECIFIC] = users
+    return params
+
+
+def _file_of(directory: Path, key: str) -> Path:
+    """
+    returns the file of a key; the key is quoted to be a valid file name.
+
+    >>> _file_of(Path("/tmp"), "user/../name")
+    PosixPath('/tmp/user%2F..%2Fname.json')
+    """
+    return directory.joinpath(quote(key, safe="") + SUFFIX)
+
+
+class ParameterStore:
+    """
+    Stores parameter per key and the parameter of each user within path.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.__cached: Tuple[Optional[int], Dict] = (None, {})
+        self.__lock = threading.Lock()
+
+    @contextmanager
+    def __locked(self) -> Iterator[None]:
+        self.path.joinpath(USER_SPECIFIC).mkdir(parents=True, exist_ok=True)
+        with open(self.path.joinpath(LOCK_FILE), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def generation(self) -> Optional[int]:
+        return _read(self.path.joinpath(GENERATION_FILE))
+
+    def __written(self):
+        # must be called while locked
+        _write(
+            self.path.joinpath(GENERATION_FILE), (self.generation() or 0) + 1
+        )
+
+    def put(self, changes: Dict):
+        """
+        writes each key of changes; user_specific replaces the parameter of
+        each contained user.
+        """
+        changes = dict(changes)
+        users = changes.pop(USER_SPECIFIC, None) or {}
+        with self.__locked():
+            for key, value in changes.items():
+                _write(_file_of(self.path, key), value)
+            for username, user_params in users.items():
+                _write(
+                    _file_of(self.path.joinpath(USER_SPECIFIC), username),
+                    user_params,
+                )
+            self.__written()
+
+    def put_user(self, username: str, changes: Dict, base: Dict = None) -> Dict:
+        """
+        updates the parameter of username with changes and returns them.
+
+        base are the parameter of the user which are used when there are no
+        stored parameter of the user yet (e.g. from a former parameter file).
+        """
+        path = _file_of(self.path.joinpath(USER_SPECIFIC), username)
+        with self.__locked():
+            stored = _read(path)
+            user_params = dict(stored if stored is not None else base or {})
+            user_params.update(changes)
+            _write(path, user_params)
+            self.__written()
+        return user_params
+
+    def load(self) -> Dict:
+        """
+        returns all stored parameter; the files are just read again when the
+        generation changed.
+
+        The returned dict is shared between callers and must not be modified.
+        """
+        generation = self.generation()
+        if generation is None:
+            return {}
+        with self.__lock:
+            cached_generation, params = self.__cached
+        if cached_generation == generation:
+            return params
+        # files written in the meantime are read as well and are read again
+        # on the next load due to the increased generation
+        params = _read_all(self.path)
+        with self.__lock:
+            self.__cached = (generation, params)
+        return params
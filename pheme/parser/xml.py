@@ -22,11 +22,25 @@ Provides XML parsing support.
 Although there is the project djangorestframework-xml xmltodict seems to be more
 reliable for our usecase.
 
+For gvmd scan reports there are additionally streaming parser which are based on
+iterparse; they return the same structure as xmltodict but the results of a
+report are lazily created while iterating over `report.results.result`.
 """
+from io import BytesIO
+from typing import Dict, Iterator, List, Optional, Union
+from xml.etree.ElementTree import Element, iterparse
+
 from rest_framework.parsers import BaseParser
 import xmltodict
 
 
+def find_xml_upload(stream):
+    for report in stream.FILES.values():
+        if report.content_type == "text/xml":
+            return report
+    return None
+
+
 class XMLFormParser(BaseParser):
     """
     XML parser based on xmltodict.
@@ -35,15 +49,15 @@ class XMLFormParser(BaseParser):
     media_type = "multipart/form-data"
 
     def parse(self, stream, media_type=None, parser_context=None):
-        for report in stream.FILES.values():
-            if report.content_type == "text/xml":
-                return xmltodict.parse(
-                    report.read(),
-                    attr_prefix="",
-                    cdata_key="text",
-                    dict_constructor=dict,
-                )
-        return None
+        report = find_xml_upload(stream)
+        if report is None:
+            return None
+        return xmltodict.parse(
+            report.read(),
+            attr_prefix="",
+            cdata_key="text",
+            dict_constructor=dict,
+        )
 
 
 class XMLParser(BaseParser):
@@ -57,3 +71,194 @@ class XMLParser(BaseParser):
         return xmltodict.parse(
             stream, attr_prefix="", cdata_key="text", dict_constructor=dict
         )
+
+
+def _add_value(container: Dict, key: str, value):
+    """
+    adds value to container like xmltodict does; when a key already exists
+    the value will be turned into a list.
+    """
+    if key not in container:
+        container[key] = value
+    elif isinstance(container[key], list):
+        container[key].append(value)
+    else:
+        container[key] = [container[key], value]
+
+
+def _element_text(element: Element) -> Optional[str]:
+    text = "".join(
+        [element.text or ""] + [child.tail or "" for child in element]
+    ).strip()
+    return text or None
+
+
+def _element_to_dict(element: Element) -> Union[Dict, str, None]:
+    """
+    transforms an element to the same structure as
+    xmltodict.parse(attr_prefix="", cdata_key="text", dict_constructor=dict)
+
+    >>> from xml.etree.ElementTree import fromstring
+    >>> _element_to_dict(fromstring('<a x="1">hi<b>t</b>tail<b/></a>'))
+    {'x': '1', 'b': ['t', None], 'text': 'hitail'}
+    """
+    text = _element_text(element)
+    if not element.attrib and len(element) == 0:
+        return text
+    result = dict(element.attrib)
+    for child in element:
+        _add_value(result, child.tag, _element_to_dict(child))
+    if text:
+        _add_value(result, "text", text)
+    return result
+
+
+class _ReportStream:
+    """
+    Drives iterparse over a gvmd report.
+
+    The root element, nested report elements and results elements are kept as
+    open containers; every other direct child of such a container is
+    transformed into a dict as soon as it is closed and removed from the
+    element tree afterwards.
+
+    Result elements within results are not added to a container but are
+    handed out one by one via results so that just one result needs to be in
+    memory at a time.
+    """
+
+    __containers = ("report", "results")
+
+    def __init__(self, source):
+        self.__events = iterparse(source, events=("start", "end"))
+        # elements and their dict when they are an open container
+        self.__stack: List[Element] = []
+        self.__dicts: List[Optional[Dict]] = []
+        self.document: Dict = {}
+
+    def __is_container(self, element: Element) -> bool:
+        if not self.__stack:
+            return True
+        return (
+            element.tag in self.__containers
+            and self.__dicts[-1] is not None
+            and (element.tag != "report" or self.__stack[-1].tag == "report")
+        )
+
+    def __start(self, element: Element) -> Optional[Dict]:
+        container = None
+        if self.__is_container(element):
+            container = dict(element.attrib)
+            if self.__dicts:
+                _add_value(self.__dicts[-1], element.tag, container)
+            else:
+                self.document[element.tag] = container
+        self.__stack.append(element)
+        self.__dicts.append(container)
+        return container if element.tag == "results" else None
+
+    def __end(self, element: Element) -> Optional[Dict]:
+        self.__stack.pop()
+        container = self.__dicts.pop()
+        if container is not None:
+            text = _element_text(element)
+            if text:
+                _add_value(container, "text", text)
+            element.clear()
+            if self.__stack:
+                self.__stack[-1].remove(element)
+            return None
+        parent = self.__dicts[-1] if self.__dicts else None
+        if parent is None:
+            # part of a not yet closed element
+            return None
+        value = _element_to_dict(element)
+        self.__stack[-1].remove(element)
+        if element.tag == "result" and self.__stack[-1].tag == "results":
+            return value
+        _add_value(parent, element.tag, value)
+        return None
+
+    def open_results(self) -> Optional[Dict]:
+        """
+        processes the document until the first results container is opened.
+
+        Returns the results dict or None when the document does not contain
+        any results.
+        """
+        for event, element in self.__events:
+            if event == "start":
+                results = self.__start(element)
+                if results is not None:
+                    return results
+            else:
+                self.__end(element)
+        return None
+
+    def results(self) -> Iterator[Dict]:
+        """
+        yields each result and processes the rest of the document afterwards.
+        """
+        for event, element in self.__events:
+            if event == "start":
+                self.__start(element)
+            else:
+                result = self.__end(element)
+                if result is not None:
+                    yield result
+
+
+def iterparse_report(source) -> Dict:
+    """
+    parses a gvmd report into the same structure xmltodict would create,
+    except that the first `results.result` is a generator over each result.
+
+    All elements before the results are parsed eagerly; all elements after the
+    results (e.g. host) are available after the result generator got
+    exhausted.
+
+    >>> data = iterparse_report(
+    ...     '<report id="1"><results><result>a</result><result>b</result>'
+    ...     '</results><host><ip>127.0.0.1</ip></host></report>'
+    ... )
+    >>> data['report']['id']
+    '1'
+    >>> list(data['report']['results']['result'])
+    ['a', 'b']
+    >>> data['report']['host']
+    {'ip': '127.0.0.1'}
+    """
+    if isinstance(source, str):
+        source = source.encode()
+    if isinstance(source, bytes):
+        source = BytesIO(source)
+    stream = _ReportStream(source)
+    results = stream.open_results()
+    if results is not None:
+        results["result"] = stream.results()
+    return stream.document
+
+
+class XMLStreamFormParser(BaseParser):
+    """
+    Streaming XML parser for uploaded gvmd reports.
+    """
+
+    media_type = "multipart/form-data"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        report = find_xml_upload(stream)
+        if report is None:
+            return None
+        return iterparse_report(report)
+
+
+class XMLStreamParser(BaseParser):
+    """
+    Streaming XML parser for gvmd reports.
+    """
+
+    media_type = "application/xml"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return iterparse_report(stream)
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+# pheme/render_cache.py
+# Copyright (C) 2021 Greenbone Networks GmbH
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Caches rendered reports (e.g. html or pdf) within the default cache.
+
+A rendered report is identified by:
+
+- the media type of the renderer
+- the name of the stored report; a stored report does not change
+- the query parameter of the request which change a rendered report
+  (RENDERED_QUERY_PARAMETER, e.g. without_overview); others like the token
+  of a gsad session are not part of the key
+- a hash of the effective parameter including the user specific ones
+- the version of pheme
+- the generation which is increased on each parameter write
+
+Since a changed template, parameter or user results in a different key the
+cache is used regardless of DEBUG.
+"""
+import hashlib
+import threading
+import time
+from typing import Dict, Optional
+
+from django.core.cache import cache
+
+from pheme import settings
+from pheme.version import __version__
+
+GENERATION_KEY = "render-cache-generation"
+# query parameter which change a rendered report
+RENDERED_QUERY_PARAMETER = ("without_overview",)
+
+
+def __update_digest(digest, value):
+    """
+    adds a json like value to digest.
+
+    In difference to hashing json.dumps(value, sort_keys=True) strings are
+    not escaped which is noticeable for large values like images.
+    """
+    if isinstance(value, dict):
+        digest.update(b"{")
+        for key in sorted(value, key=str):
+            __update_digest(digest, str(key))
+            __update_digest(digest, value[key])
+        digest.update(b"}")
+    elif isinstance(value, (list, tuple)):
+        digest.update(b"[")
+        for item in value:
+            __update_digest(digest, item)
+        digest.update(b"]")
+    else:
+        encoded = str(value).encode()
+        # the type and length separate values like "1" and 1 or "a", "b"
+        # and "ab"
+        digest.update(
+            "{}:{}:".format(type(value).__name__, len(encoded)).encode()
+        )
+        digest.update(encoded)
+
+
+def digest_of(*values) -> str:
+    """
+    returns a hash of json like values.
+
+    >>> digest_of({"b": 1, "a": [1, "2"]}) == digest_of({"a": [1, "2"], "b": 1})
+    True
+    >>> digest_of({"a": "1"}) == digest_of({"a": 1})
+    False
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for value in values:
+        __update_digest(digest, value)
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """
+    Keeps rendered reports within the default cache and counts hits and
+    misses of the process.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def generation() -> int:
+        """
+        returns the current generation.
+
+        A lost generation (e.g. culled by the cache) starts with the current
+        time instead of 0 so that no generation of which rendered reports
+        may still exist is used again.
+        """
+        generation = cache.get(GENERATION_KEY)
+        if generation is None:
+            cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+            generation = cache.get(GENERATION_KEY, 0)
+        return generation
+
+    def invalidate(self):
+        """
+        invalidates all rendered reports of all processes sharing the cache.
+
+        The rendered reports are not removed but are not used anymore; they
+        are removed by the cache after their timeout.
+        """
+        try:
+            generation = cache.incr(GENERATION_KEY)
+        except ValueError:
+            generation = self.generation() + 1
+        # incr of e.g. the FileBasedCache writes the key with the default
+        # timeout; the generation must not expire
+        cache.set(GENERATION_KEY, generation, timeout=None)
+
+    def key(
+        self, media_type: str, name: str, parameter: Dict, query: Dict
+    ) -> Optional[str]:
+        """
+        returns the key of a rendered report or None when the cache is
+        disabled or there is no name.
+
+        Just the RENDERED_QUERY_PARAMETER of query are part of the key.
+
+        >>> cache = RenderCache()
+        >>> key = lambda query: cache.key("text/html", "report", {}, query)
+        >>> key({"token": "abc"}) == key({"token": "def"}) == key({})
+        True
+        >>> key({"without_overview": "1"}) == key({})
+        False
+        """
+        if not self.enabled or not name:
+            return None
+        query = {
+            k: v for k, v in query.items() if k in RENDERED_QUERY_PARAMETER
+        }
+        return "render/{}/{}/{}/{}/{}".format(
+            media_type,
+            name,
+            __version__,
+            self.generation(),
+            digest_of(parameter, query),
+        )
+
+    def get(self, key: Optional[str]):
+        if key is None:
+            return None
+        value = cache.get(key)
+        with self.__lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: Optional[str], value):
+        if key is not None:
+            cache.set(key, value)
+
+    def info(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "generation": self.generation(),
+        }
+
+    def clear(self):
+        with self.__lock:
+            self.hits = 0
+            self.misses = 0
+
+
+render_cache = RenderCache(settings.RENDER_CACHE)
@@ -16,50 +16,337 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
-from typing import List, Dict, Generator, Union
+import json
 from io import StringIO
+from typing import Dict, Iterable, Iterator, List
 from csv import DictWriter
+from xml.sax.saxutils import XMLGenerator
 from rest_framework.renderers import BaseRenderer
 import xmltodict
 
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
 
-class CSVRenderer(BaseRenderer):
-    media_type = "text/csv"
-    format = "text"
-    charset = "utf-8"
+# amount of rows per record batch of an arrow export
+ARROW_BATCH_SIZE = 65536
+
+# the keys of a resolved result; the nvt information are placed in between
+# description and qod_value
+__RESULT_KEYS_BEFORE_NVT = ["port", "threat", "severity", "description"]
+__RESULT_KEYS_AFTER_NVT = ["qod_value", "qod_type"]
+
+
+class _Echo:
+    """
+    A file like object which just returns a written line instead of keeping
+    it so that a csv writer can be used to create single lines.
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def csv_header(data: Dict, nvts: Iterable[Dict]) -> List[str]:
+    """
+    returns the columns of a csv export of a report.
+
+    The columns are created based on the report without results and the nvt
+    information of the report (see pheme.transformation.scanreport.store.nvts)
+    so that they are known before the first result is written and do not
+    depend on the order of the results.
 
-    def __flatten_per_result(
-        self, data: Dict
-    ) -> Generator[Union[List[str], Dict], None, None]:
-        # for the case that results is there but it is None
-        results = data.pop("results", None) or []
-        send_keys = True
-        for host in results:
-            for result in host.get("results"):
-                flatten = {
+    >>> csv_header(
+    ...     {"name": "test", "results": []},
+    ...     [{"nvt_oid": "1", "nvt_tags_interpreted": {"summary": "x"}}],
+    ... )
+    ['name', 'os', 'summary', 'port', 'threat', 'severity', 'description', \
+'nvt_oid', 'qod_value', 'qod_type']
+    """
+    nvts = list(nvts)
+    tags = [
+        key
+        for nvt in nvts
+        for key in (nvt.get("nvt_tags_interpreted") or {}).keys()
+    ]
+    nvt_keys = [
+        key for nvt in nvts for key in nvt if key != "nvt_tags_interpreted"
+    ]
+    columns = [key for key in data if key != "results"]
+    columns += ["os", *tags, *__RESULT_KEYS_BEFORE_NVT, *nvt_keys]
+    columns += __RESULT_KEYS_AFTER_NVT
+    # keep the first position of a key like a dict update would
+    return list(dict.fromkeys(columns))
+
+
+def stream_csv(
+    data: Dict, hosts: Iterable[Dict], nvts: Iterable[Dict]
+) -> Iterator[str]:
+    """
+    yields the lines of a csv export with one row per result.
+
+    Just a single row is kept in memory at a time; it is used for a
+    StreamingHttpResponse.
+    """
+    # values of the report are the same in each row (e.g. overview) and are
+    # therefore converted just once instead of by the writer per row
+    data = {
+        k: v if v is None or isinstance(v, (str, int, float)) else str(v)
+        for k, v in data.items()
+        if k != "results"
+    }
+    header = csv_header(data, nvts)
+    writer = DictWriter(_Echo(), header, restval="", extrasaction="ignore")
+    yield writer.writerow(dict(zip(header, header)))
+    for host in hosts:
+        for result in host.get("results") or []:
+            yield writer.writerow(
+                {
                     **data,
-                    "os": host.get("os"),
-                    **result.pop("nvt_tags_interpreted", {}),
+                    "os": (host.get("equipment") or {}).get("os"),
+                    **(result.get("nvt_tags_interpreted") or {}),
                     **result,
                 }
-                if send_keys:
-                    yield flatten.keys()
-                    send_keys = False
-                yield flatten
+            )
+
+
+def _results_of(hosts: Iterable[Dict]) -> Iterator[Dict]:
+    # a resolved result contains the nvt information and can be used in
+    # place of the nvt catalogue to create the header
+    for host in hosts:
+        yield from host.get("results") or []
+
+
+def __host_columns(data: Dict, host: Dict) -> Dict:
+    return {
+        "report_id": data.get("id"),
+        "host": host.get("host"),
+        "os": (host.get("equipment") or {}).get("os"),
+    }
+
+
+def stream_ndjson(
+    data: Dict, hosts: Iterable[Dict], _nvts: Iterable[Dict]
+) -> Iterator[str]:
+    """
+    yields a json object per result containing the report id, host and os
+    followed by the result with its nvt information.
+
+    The host columns are encoded once per host and prepended to each encoded
+    result instead of merging the dicts per result.
+
+    >>> list(stream_ndjson(
+    ...     {"id": "r"},
+    ...     [{"host": "h", "results": [{"port": "80/tcp"}]}],
+    ...     [],
+    ... ))
+    ['{"report_id": "r", "host": "h", "os": null, "port": "80/tcp"}\\n']
+    """
+    encode = json.JSONEncoder(default=str).encode
+    for host in hosts:
+        host_columns = encode(__host_columns(data, host))
+        prefix = host_columns[:-1] + ", "
+        for result in host.get("results") or []:
+            encoded = encode(result)
+            if len(encoded) > 2:
+                yield prefix + encoded[1:] + "\n"
+            else:
+                yield host_columns + "\n"
+
+
+def arrow_columns(nvts: Iterable[Dict]) -> List[str]:
+    """
+    returns the columns of an arrow export of a report.
+
+    >>> arrow_columns([{"nvt_oid": "1", "nvt_name": "test"}])
+    ['report_id', 'host', 'os', 'port', 'threat', 'severity', 'description', \
+'qod_value', 'qod_type', 'nvt_oid', 'nvt_name']
+    """
+    columns = ["report_id", "host", "os"]
+    columns += __RESULT_KEYS_BEFORE_NVT + __RESULT_KEYS_AFTER_NVT
+    columns += [key for nvt in nvts for key in nvt if key.startswith("nvt_")]
+    return list(dict.fromkeys(columns))
+
+
+class _Chunks:
+    """
+    A file like object which keeps the written bytes until they are taken.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, value: bytes) -> int:
+        self.chunks.append(bytes(value))
+        return len(value)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        value = b"".join(self.chunks)
+        self.chunks = []
+        return value
+
+
+def stream_arrow(
+    data: Dict, hosts: Iterable[Dict], nvts: Iterable[Dict]
+) -> Iterator[bytes]:
+    """
+    yields an arrow ipc stream with a row per result in record batches of
+    ARROW_BATCH_SIZE rows.
+
+    Severity is a float column, all other columns are strings; nested
+    values (e.g. nvt_tags_interpreted) are encoded as json.
+    """
+    columns = arrow_columns(nvts)
+    schema = pyarrow.schema(
+        [
+            (
+                column,
+                pyarrow.float64() if column == "severity" else pyarrow.string(),
+            )
+            for column in columns
+        ]
+    )
+    encode = json.JSONEncoder(default=str).encode
+
+    def to_column_value(column: str, value):
+        if value is None or column == "severity":
+            return value
+        if isinstance(value, (dict, list)):
+            return encode(value)
+        return str(value)
+
+    sink = _Chunks()
+    with pyarrow.ipc.new_stream(sink, schema) as writer:
+        batch = {column: [] for column in columns}
+        rows = 0
+
+        def write_batch():
+            writer.write_batch(
+                pyarrow.record_batch(
+                    [batch[column] for column in columns], schema=schema
+                )
+            )
+            for values in batch.values():
+                values.clear()
+
+        for host in hosts:
+            host_columns = __host_columns(data, host)
+            for result in host.get("results") or []:
+                for column, values in batch.items():
+                    value = host_columns.get(column, result.get(column))
+                    values.append(to_column_value(column, value))
+                rows += 1
+                if rows % ARROW_BATCH_SIZE == 0:
+                    write_batch()
+                    yield sink.take()
+        if rows % ARROW_BATCH_SIZE:
+            write_batch()
+    yield sink.take()
+
+
+def stream_xml(
+    data: Dict, hosts: Iterable[Dict], _nvts: Iterable[Dict]
+) -> Iterator[str]:
+    """
+    yields a xml document with report as root element like
+    xmltodict.unparse({"report": data}) would create; each host is
+    unparsed and yielded on its own.
+
+    >>> "".join(stream_xml(
+    ...     {"id": "r", "results": []}, [{"host": "h"}], []
+    ... ))
+    '<?xml version="1.0" encoding="utf-8"?>\\n\
+<report><id>r</id><results><host>h</host></results></report>'
+    """
+    output = StringIO()
+
+    def take() -> str:
+        value = output.getvalue()
+        output.seek(0)
+        output.truncate()
+        return value
+
+    generator = XMLGenerator(output, "utf-8")
+    generator.startDocument()
+    generator.startElement("report", {})
+    for key, value in data.items():
+        if key == "results" and value is not None:
+            for host in hosts:
+                xmltodict.unparse(
+                    {key: host}, output=output, full_document=False
+                )
+                yield take()
+        else:
+            xmltodict.unparse({key: value}, output=output, full_document=False)
+    generator.endElement("report")
+    generator.endDocument()
+    yield take()
+
+
+class StreamingRenderer(BaseRenderer):
+    """
+    A renderer which creates a report export by iterating over the hosts.
+
+    The report view uses stream within a StreamingHttpResponse so that the
+    export is not kept in memory; render joins the streamed chunks for
+    other usages.
+    """
+
+    def stream(
+        self, data: Dict, hosts: Iterable[Dict], nvts: Iterable[Dict]
+    ) -> Iterator:
+        raise NotImplementedError()
 
     def render(self, data, accepted_media_type=None, renderer_context=None):
         if data is None:
             return ""
-        try:
-            generator = self.__flatten_per_result(data)
-            result = StringIO()
-            writer = DictWriter(result, next(generator))
-            writer.writeheader()
-            writer.writerows(generator)
-            result.seek(0)
-            return result.read()
-        except StopIteration:
-            return ""
+        hosts = data.get("results") or []
+        chunks = self.stream(data, hosts, _results_of(hosts))
+        return ("" if self.charset else b"").join(chunks)
+
+
+class CSVRenderer(StreamingRenderer):
+    media_type = "text/csv"
+    format = "text"
+    charset = "utf-8"
+
+    def stream(self, data, hosts, nvts):
+        return stream_csv(data, hosts, nvts)
+
+
+class NDJSONRenderer(StreamingRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def stream(self, data, hosts, nvts):
+        return stream_ndjson(data, hosts, nvts)
+
+
+class ArrowRenderer(StreamingRenderer):
+    """
+    Renders a report as arrow ipc stream; requires pyarrow.
+    """
+
+    media_type = "application/vnd.apache.arrow.stream"
+    format = "arrow"
+    charset = None
+
+    def stream(self, data, hosts, nvts):
+        return stream_arrow(data, hosts, nvts)
+
+
+# columnar exports of a report; arrow is just available with pyarrow
+COLUMNAR_RENDERERS = [NDJSONRenderer] + ([ArrowRenderer] if pyarrow else [])
 
 
 class MarkDownTableRenderer(BaseRenderer):
@@ -115,11 +402,20 @@ class MarkDownTableRenderer(BaseRenderer):
         return first_line + table_indicator + rest
 
 
-class XMLRenderer(BaseRenderer):
+class XMLRenderer(StreamingRenderer):
+    """
+    Renders data with exactly one root element as xml.
+
+    A report is streamed with report as root element instead.
+    """
+
     media_type = "application/xml"
     format = "xml"
     charset = "utf-8"
 
+    def stream(self, data, hosts, nvts):
+        return stream_xml(data, hosts, nvts)
+
     def render(self, data, accepted_media_type=None, renderer_context=None):
         if data is None:
             return ""
@@ -44,6 +44,18 @@ TEMPLATE_DIR = BASE_DIR / "template"
 # set default to actual gos path instead of static dir
 
 GSAD_URL = os.environ.get("GSAD_URL", "https://localhost/gmp")
+# seconds to wait for gsad to connect and to answer
+GSAD_TIMEOUT = float(os.environ.get("PHEME_GSAD_TIMEOUT", "10"))
+# amount of kept alive connections to gsad
+GSAD_POOL_SIZE = int(os.environ.get("PHEME_GSAD_POOL_SIZE", "10"))
+# seconds a user and role of a token and GSAD_SID are kept
+GSAD_CACHE_TTL = int(os.environ.get("PHEME_GSAD_CACHE_TTL", "60"))
+# seconds an unknown token and GSAD_SID is kept
+GSAD_CACHE_NEGATIVE_TTL = int(
+    os.environ.get("PHEME_GSAD_CACHE_NEGATIVE_TTL", "5")
+)
+# amount of kept users and roles
+GSAD_CACHE_SIZE = int(os.environ.get("PHEME_GSAD_CACHE_SIZE", "1024"))
 
 SENTRY_DSN = os.environ.get("SENTRY_DSN_PHEME")
 
@@ -85,6 +97,29 @@ DEFAULT_PARAMETER_ADDRESS = (
 )
 
 
+# amount of processes rendering PDF; 0 renders within the request thread
+PDF_WORKERS = int(os.environ.get("PHEME_PDF_WORKERS", "0"))
+# amount of PDF renders either running or waiting for a worker
+PDF_QUEUE_SIZE = int(os.environ.get("PHEME_PDF_QUEUE_SIZE", "8"))
+# seconds a request waits for a place within a full queue before it is rejected
+PDF_QUEUE_TIMEOUT = int(os.environ.get("PHEME_PDF_QUEUE_TIMEOUT", "5"))
+# seconds a queued PDF render may wait for a worker and run
+PDF_TIMEOUT = int(os.environ.get("PHEME_PDF_TIMEOUT", "600"))
+# amount of compiled templates kept in memory
+TEMPLATE_CACHE_SIZE = int(os.environ.get("PHEME_TEMPLATE_CACHE_SIZE", "64"))
+# cache rendered reports (html, pdf) keyed by their parameter and version
+RENDER_CACHE = os.environ.get("PHEME_RENDER_CACHE", "true").lower() == "true"
+# comma separated media types (text/html, application/pdf) of reports which
+# are rendered into the render cache right after a transformation
+PRE_RENDER = [
+    media_type.strip()
+    for media_type in os.environ.get("PHEME_PRE_RENDER", "").split(",")
+    if media_type.strip()
+]
+# amount of threads running asynchronous jobs (e.g. transform?async=1)
+JOB_WORKERS = int(os.environ.get("PHEME_JOB_WORKERS", "2"))
+
+
 def __load_or_create_api_key() -> str:
     if SECRET_KEY_LOCATION.exists():
         may_token = SECRET_KEY_LOCATION.read_text()
@@ -215,12 +250,62 @@ LOGGING = {
 # https://docs.djangoproject.com/en/3.1/topics/cache/
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "BACKEND": "pheme.storage.CodecFileBasedCache",
         "LOCATION": "/tmp/django_cache",
         "TIMEOUT": 1 * 60 * 2 * 60,  # 2 hours
-    }
+        "OPTIONS": {
+            # pickle or marshal
+            "SERIALIZER": os.environ.get("PHEME_STORAGE_SERIALIZER", "pickle"),
+            # none, zlib, lzma or bz2
+            "COMPRESSION": os.environ.get("PHEME_STORAGE_COMPRESSION", "zlib"),
+            "COMPRESSION_LEVEL": (
+                int(os.environ["PHEME_STORAGE_COMPRESSION_LEVEL"])
+                if os.environ.get("PHEME_STORAGE_COMPRESSION_LEVEL")
+                else None
+            ),
+        },
+    },
+    # least recently used charts are removed first
+    "charts": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "pheme-charts",
+        "TIMEOUT": 1 * 60 * 2 * 60,  # 2 hours
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.environ.get("PHEME_CHART_CACHE_SIZE", "512"))
+        },
+    },
 }
 
+# transformed reports are stored in an indexed file per report
+REPORT_STORE_PATH = os.environ.get(
+    "PHEME_REPORT_STORE_PATH", "/tmp/pheme_reports"
+)
+REPORT_STORE_TIMEOUT = CACHES["default"]["TIMEOUT"]
+# amount of loaded reports kept in memory per process; 0 disables it
+REPORT_CACHE_SIZE = int(os.environ.get("PHEME_REPORT_CACHE_SIZE", "8"))
+# maximal summed size in bytes of the stored reports kept in memory
+REPORT_CACHE_BYTES = int(
+    os.environ.get("PHEME_REPORT_CACHE_BYTES", str(256 * 1024 * 1024))
+)
+
+# uploaded images are stored once per content
+BLOB_STORE_PATH = os.environ.get(
+    "PHEME_BLOB_STORE_PATH", str(PHEME_CONFIGURATION_PATH.joinpath("blobs"))
+)
+# absolute url of pheme (e.g. https://gsa.example/pheme/) used by html reports
+# to link uploaded images; without it images are embedded as data links
+BLOB_BASE_URL = os.environ.get("PHEME_BLOB_BASE_URL")
+# uploaded images are downscaled to fit a DIN A4 page with IMAGE_MAX_DPI
+IMAGE_MAX_DPI = int(os.environ.get("PHEME_IMAGE_MAX_DPI", "150"))
+# maximal width and height in pixel of an uploaded image
+IMAGE_MAX_SIZE = int(
+    os.environ.get(
+        "PHEME_IMAGE_MAX_SIZE", str(round(297 / 25.4 * IMAGE_MAX_DPI))
+    )
+)
+# quality of recompressed jpeg images
+IMAGE_JPEG_QUALITY = int(os.environ.get("PHEME_IMAGE_JPEG_QUALITY", "85"))
+
 # testing
 REST_FRAMEWORK = {
     "TEST_REQUEST_RENDERER_CLASSES": [
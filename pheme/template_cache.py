@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# pheme/template_cache.py
+# Copyright (C) 2021 Greenbone Networks GmbH
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Caches compiled django templates of template sources provided via parameter
+or cache (e.g. html templates and css of a report format).
+
+The templates are identified by a hash of their source so that a changed
+parameter results in a new template while an unchanged one is compiled just
+once per process.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict
+
+from django.template import Template
+
+from pheme import settings
+
+
+class TemplateCache:
+    """
+    LRU cache of compiled templates keyed by the hash of their source.
+
+    >>> cache = TemplateCache(maxsize=1)
+    >>> cache.get("{{ a }}") is cache.get("{{ a }}")
+    True
+    >>> _ = cache.get("{{ b }}")
+    >>> cache.info()
+    {'hits': 1, 'misses': 2, 'size': 1, 'maxsize': 1}
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.__templates: Dict[bytes, Template] = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, source: str) -> Template:
+        """
+        returns the compiled template of source
+        """
+        key = hashlib.blake2b(source.encode(), digest_size=16).digest()
+        with self.__lock:
+            template = self.__templates.get(key)
+            if template is not None:
+                self.hits += 1
+                self.__templates.move_to_end(key)
+                return template
+            self.misses += 1
+        # compile outside of the lock; a concurrent miss compiles twice
+        template = Template(source)
+        with self.__lock:
+            self.__templates[key] = template
+            while len(self.__templates) > self.maxsize:
+                self.__templates.popitem(last=False)
+        return template
+
+    def info(self) -> Dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.__templates),
+            "maxsize": self.maxsize,
+        }
+
+    def clear(self):
+        with self.__lock:
+            self.__templates.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+template_cache = TemplateCache(settings.TEMPLATE_CACHE_SIZE)
+
+
+def compile_template(source: str) -> Template:
+    """
+    returns the compiled template of source via the shared template cache.
+    """
+    return template_cache.get(source)
@@ -16,8 +16,14 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from typing import Dict
+import functools
+import hashlib
+import json
+from typing import Callable, Dict, Optional
 from django import template
+from django.core.cache import caches
+from django.utils.safestring import SafeText
+from pheme.version import __version__
 
 _severity_class_colors = {
     "High": "#d4003e",
@@ -87,3 +93,43 @@ def build_legend(
         y_pos += font_size + font_size / 2
 
     return __LEGEND_TEMPLATE.format(x=0, y=start_height, legend=legend_elements)
+
+
+def __chart_key(name: str, args, kwargs) -> Optional[str]:
+    def not_serializable(obj):
+        raise TypeError("{} is not serializable".format(type(obj)))
+
+    try:
+        identifier = json.dumps(
+            [__version__, name, args, kwargs], default=not_serializable
+        )
+    except (TypeError, ValueError):
+        return None
+    return "chart/{}/{}".format(
+        name, hashlib.blake2b(identifier.encode(), digest_size=16).hexdigest()
+    )
+
+
+def cached_chart(func: Callable[..., SafeText]) -> Callable[..., SafeText]:
+    """
+    Memoizes a chart within the chart cache.
+
+    The key is a hash of the chart name, the input data and all other
+    parameter (e.g. width, colors, fonts) so that the same report results in
+    the same chart for HTML, PDF and the report format editor. Charts of data
+    which cannot be represented as JSON are not cached.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs) -> SafeText:
+        key = __chart_key(func.__name__, args, kwargs)
+        if key is None:
+            return func(*args, **kwargs)
+        chart_cache = caches["charts"]
+        chart = chart_cache.get(key)
+        if chart is None:
+            chart = func(*args, **kwargs)
+            chart_cache.set(key, str(chart))
+        return SafeText(chart)
+
+    return wrapper
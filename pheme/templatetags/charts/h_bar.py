@@ -21,6 +21,7 @@ import itertools
 from typing import Dict
 from django.utils.safestring import SafeText
 from pheme.templatetags.charts import (
+    cached_chart,
     register,
     _severity_class_colors,
     build_legend,
@@ -79,6 +80,7 @@ __BAR_CHART_TEMPLATE = """
 
 @register.filter
 @register.simple_tag
+@cached_chart
 def h_bar_chart(
     chart_data: Dict[str, Dict[str, int]],
     x_title: str = "",
@@ -20,6 +20,7 @@ import math
 from typing import Dict
 from django.utils.safestring import SafeText
 from pheme.templatetags.charts import (
+    cached_chart,
     calculate_legend_start_height,
     register,
     _severity_class_colors,
@@ -44,6 +45,7 @@ __SLICE_TEMPLATE = """
 
 
 @register.filter
+@cached_chart
 def pie_chart(
     input_values: Dict,
     title_color: Dict = None,
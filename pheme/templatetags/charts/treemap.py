@@ -32,6 +32,7 @@ from typing import Dict, List
 from django.utils.safestring import SafeText
 
 from pheme.templatetags.charts import (
+    cached_chart,
     _severity_class_colors,
     register,
     build_legend,
@@ -123,11 +124,55 @@ def __leftover(sizes: List[numbers.Number], rect: Rect) -> Rect:
     return __leftovercol(covered_area, rect)
 
 
-def __find_split(sizes: List[numbers.Number], rect: Rect) -> int:
+def __worst_ratio(
+    sizes: List[numbers.Number],
+    row: range,
+    covered_area: float,
+    smallest: float,
+    biggest: float,
+    rect: Rect,
+) -> float:
+    """
+    returns the worst aspect ratio of a row laid out by __layout.
+
+    The aspect ratio of a rectangle only depends on its size. Its side along
+    the row grows with its size as long as the sides of all sizes are either
+    padded or not (the padding is just added to sides longer than 2px, see
+    __create_rectangle); then the worst ratio is the one of the smallest or
+    the biggest size so that it is sufficient to know the covered area, the
+    smallest and the biggest size of a row. Otherwise each rectangle of the
+    row (sizes at the indexes of row) is created.
+
+    >>> sizes, rect = [2045.5, 1227.3], Rect(0, 0, 90, 50)
+    >>> __worst_ratio(sizes, range(2), sum(sizes), 1227.3, 2045.5, rect)
+    3.7884179104477615
+    """
+    thickness = covered_area / min(rect.dx, rect.dy)
+
+    def create(size: float) -> Rect:
+        if rect.dx >= rect.dy:
+            return __create_rectangle(0, 0, thickness, size / thickness)
+        return __create_rectangle(0, 0, size / thickness, thickness)
+
+    if (smallest / thickness > 2) == (biggest / thickness > 2):
+        candidates = [create(smallest), create(biggest)]
+    else:
+        candidates = [create(sizes[i]) for i in row]
+    return max(max(c.dx / c.dy, c.dy / c.dx) for c in candidates)
+
+
+def __find_split(
+    sizes: List[numbers.Number], rect: Rect, start: int = 0
+) -> int:
     """
     returns the index to split the sizes based on worst ratio to get the
     remaining and current space.
 
+    The row starts at start; the covered area, smallest and biggest size of
+    the row are kept while the row grows so that each additional size is
+    checked in constant time unless the row contains rectangles with and
+    without padding.
+
     For an example the area ratio of 5, 3, 2, 1 with the area of 90 * 50
     >>> test_data = [2045.5, 1227.3, 818.2, 409.0 ]
     >>> __find_split(test_data, Rect(0, 0, 90, 50))
@@ -137,18 +182,21 @@ def __find_split(sizes: List[numbers.Number], rect: Rect) -> int:
     calculated for the remaining space.
 
     """
-
-    def worst(i: int) -> float:
-        return max(
-            [
-                max(rect.dx / rect.dy, rect.dy / rect.dx)
-                for rect in __layout(sizes[:i], rect)
-            ]
+    covered_area = sizes[start]
+    smallest = biggest = sizes[start]
+    worst = __worst_ratio(
+        sizes, range(start, start + 1), covered_area, smallest, biggest, rect
+    )
+    for i in range(start + 1, len(sizes)):
+        covered_area += sizes[i]
+        smallest = min(smallest, sizes[i])
+        biggest = max(biggest, sizes[i])
+        next_worst = __worst_ratio(
+            sizes, range(start, i + 1), covered_area, smallest, biggest, rect
         )
-
-    for i in range(1, len(sizes)):
-        if worst(i) < worst(i + 1):
+        if worst < next_worst:
             return i
+        worst = next_worst
     return len(sizes) - 1
 
 
@@ -158,6 +206,11 @@ def __squarify(sizes: List[numbers.Number], rect: Rect) -> List[Rect]:
     van Wijk, "Squarified Treemaps" and "squarify":
     https://github.com/laserson/squarify
 
+    The rows are found iteratively; rectangles are just created for a row
+    when it is complete. The sizes are normalized once instead of per row;
+    therefore a side of exactly 2px may be padded differently than by the
+    former recursive version due to rounding.
+
     >>> __squarify([5, 1], Rect(0, 0, 90, 50))
     [Rect(x=1, y=1, dx=73.0, dy=48.0), Rect(x=76.0, y=1, dx=13.0, dy=48.0)]
 
@@ -183,16 +236,15 @@ def __squarify(sizes: List[numbers.Number], rect: Rect) -> List[Rect]:
 
     sizes = list([size * total_area / total_size for size in sizes])
 
-    if len(sizes) == 1:
-        return __layout(sizes, rect)
-
-    i = __find_split(sizes, rect)
-    current = sizes[:i]
-    remaining = sizes[i:]
-
-    return __layout(current, rect) + __squarify(
-        remaining, __leftover(current, rect)
-    )
+    rects = []
+    start = 0
+    while len(sizes) - start > 1:
+        end = __find_split(sizes, rect, start)
+        current = sizes[start:end]
+        rects += __layout(current, rect)
+        rect = __leftover(current, rect)
+        start = end
+    return rects + __layout(sizes[start:], rect)
 
 
 def __transform_to_tree_data(data) -> List[Dict]:
@@ -233,6 +285,7 @@ def __transform_to_tree_data(data) -> List[Dict]:
 
 
 @register.filter
+@cached_chart
 def treemap(
     data: List[Dict],
     width: int = 1024,
@@ -280,7 +333,7 @@ def treemap(
     max_legend_len = max([len(k) for k in title_color.keys()])
     s_width = width - max_legend_len * font_size - font_size
     sizes = __squarify(sizes, Rect(0, 0, s_width, height))
-    elements = ""
+    elements = []
     for i, d in enumerate(sizes):
         label_size_in_px = len(label[i]) * font_size
         label_x = d.x + 1
@@ -292,25 +345,27 @@ def treemap(
         if d.dy <= font_size:
             max_label_len = 0
 
-        elements += __ELEMENT_TEMPLATE.format(
-            x=d.x,
-            y=d.y,
-            width=d.dx,
-            height=d.dy,
-            color=title_color.get(color_keys[i]),
-            border_color=border_color,
-            label_x=label_x,
-            label_y=label_y,
-            label=label[i][:max_label_len],
-            font_size=font_size,
-            font_family=font_family,
+        elements.append(
+            __ELEMENT_TEMPLATE.format(
+                x=d.x,
+                y=d.y,
+                width=d.dx,
+                height=d.dy,
+                color=title_color.get(color_keys[i]),
+                border_color=border_color,
+                label_x=label_x,
+                label_y=label_y,
+                label=label[i][:max_label_len],
+                font_size=font_size,
+                font_family=font_family,
+            )
         )
     legend_start = calculate_legend_start_height(height, title_color, font_size)
     return SafeText(
         __TEMPLATE.format(
             width=width,
             height=height,
-            rects=elements,
+            rects="".join(elements),
             legend=build_legend(legend_start, title_color),
             start_tree=width - s_width,
         )
@@ -26,7 +26,7 @@ as a dependency upfront.
 from django.utils.safestring import mark_safe, SafeString
 from django import template
 from pheme.parameter import load_params
-
+from pheme.template_cache import compile_template
 
 register = template.Library()
 
@@ -47,4 +47,4 @@ def dynamic_template(data, key: str) -> SafeString:
     tmpl = load_params().get(key)
     if not tmpl:
         return mark_safe("")
-    return mark_safe(template.Template(tmpl).render(template.Context(data)))
+    return mark_safe(compile_template(tmpl).render(template.Context(data)))
@@ -32,9 +32,11 @@ from typing import Dict, List, Optional
 
 
 from pheme.transformation.scanreport.model import (
-    # Equipment,
+    Equipment,
+    Host,
     Overview,
     Report,
+    Result,
 )
 
 logger = logging.getLogger(__name__)
@@ -151,79 +153,124 @@ def __create_host_information_lookup(report: Dict) -> Dict:
     return result
 
 
+class _HostAggregate:
+    """
+    Collects the results of a single host.
+
+    Counters and ports are updated in O(1) per result; the summaries used
+    within a report are created once by __finalize_host after all results
+    got processed.
+    """
+
+    __slots__ = ("host", "threats", "severities", "ports", "results")
+
+    def __init__(self, host: str, threats: int, severities: int = 10):
+        self.host = host
+        self.threats = [0] * threats
+        self.severities = [0] * severities
+        # dict instead of set to keep the order of appearance
+        self.ports = {}
+        self.results = []
+
+    def add(
+        self,
+        result: Result,
+        threat_index: Optional[int],
+        severity_index: int,
+        port: Optional[str],
+    ):
+        self.results.append(result)
+        if threat_index is not None:
+            self.threats[threat_index] += 1
+        self.severities[severity_index] += 1
+        if port and not port.startswith("general"):
+            self.ports[port] = None
+
+    def total(self) -> int:
+        return sum(self.threats)
+
+
+def __threat_dict(threats: List[int]) -> Dict:
+    return {__threats[i]: count for i, count in enumerate(threats)}
+
+
+def __finalize_host(host: _HostAggregate, os: str) -> Host:
+    return Host(
+        host=host.host,
+        threats=__host_threat_overview(__threat_dict(host.threats)),
+        severities=__host_severity_overview(host.severities),
+        equipment=Equipment(os=os, ports=set(host.ports) if host.ports else []),
+        results=host.results,
+    )
+
+
 @measure_time
-def __create_results_per_host(report: Dict) -> List[Dict]:
+def __create_results_per_host(report: Dict) -> List[Host]:
     """
     creates the results dict used by a vulnerability-report based on a given
     gvmd report.
+
+    The results of a report may be a generator (see
+    pheme.parser.xml.iterparse_report) therefore the host information are
+    looked up after all results got processed.
+
+    The nvt information are collected once per oid within a nvt catalogue
+    which is shared by the results.
     """
-    host_information_lookup = __create_host_information_lookup(report)
     results = report.get("results", {}).get("result", [])
-    by_host = {}
-    host_threat_count = {}
-    host_severity_count = {}
+    by_host: Dict[str, _HostAggregate] = {}
     threat_count = [0] * len(__threats)
 
+    nvts = {}
+
     def transform_key(prefix: str, vic: Dict) -> Dict:
         return {
             "{}_{}".format(prefix, key): value for key, value in vic.items()
         }
 
+    def __get_nvt(vic: Dict) -> Dict:
+        # tags and refs are just interpreted once per oid
+        oid = vic.get("oid")
+        nvt = nvts.get(oid)
+        if nvt is None:
+            nvt = transform_key("nvt", vic)
+            nvt["nvt_tags_interpreted"] = __tansform_tags(
+                nvt.get("nvt_tags", "")
+            )
+            nvt["nvt_refs_ref"] = __group_refs(nvt.get("nvt_refs", {}))
+            if oid is not None:
+                nvts[oid] = nvt
+        return nvt
+
     def per_result(result):
         hostname = __get_hostname_from_result(result)
-        host_dict = by_host.get(hostname, {})
+        host = by_host.get(hostname)
+        if host is None:
+            host = _HostAggregate(hostname, len(__threats))
+            by_host[hostname] = host
         threat = result.get("threat", "unknown")
         port = result.get("port")
-        nvt = transform_key("nvt", result.get("nvt", {}))
-        nvt["nvt_tags_interpreted"] = __tansform_tags(nvt.get("nvt_tags", ""))
-        nvt["nvt_refs_ref"] = __group_refs(nvt.get("nvt_refs", {}))
-        qod = transform_key("qod", result.get("qod", {}))
+        nvt = __get_nvt(result.get("nvt", {}))
+        qod = result.get("qod") or {}
         severity = float(result.get("severity", "0.0"))
-        new_host_result = {
-            "port": port,
-            "threat": threat,
-            "severity": severity,
-            "description": result.get("description"),
-            **nvt,
-            **qod,
-        }
-        host_results = host_dict.get("results", [])
-        host_results.append(new_host_result)
-        equipment = host_dict.get("equipment", {})
-        ports = list(dict.fromkeys(equipment.get("ports", [])))
-        if port and not port.startswith("general"):
-            ports = set(ports + [port])
-        equipment["ports"] = ports
-        if not equipment.get("os"):
-            equipment["os"] = host_information_lookup.get(hostname, {}).get(
-                "os", "unknown"
-            )
-
-        # needs hostname, high, medium, low
-        host_threats = host_threat_count.get(
-            hostname, {threat: 0 for threat in __threats}
-        )
         threat_index = __threat_index_lookup.get(threat)
         if threat_index is not None:
             threat_count[threat_index] += 1
-        if host_threats.get(threat) is not None:
-            host_threats[threat] += 1
-        host_threat_count[hostname] = host_threats
-
-        # needs high, medium, low
-
         # severity 1 to 10
-        host_severities = host_severity_count.get(hostname, [0] * 10)
-        host_severities[int(severity) - 1] += 1
-        host_severity_count[hostname] = host_severities
-
-        by_host[hostname] = {
-            "host": hostname,
-            "threats": __host_threat_overview(host_threats),
-            "severities": __host_severity_overview(host_severities),
-            "equipment": equipment,
-            "results": host_results,
-        }
+        host.add(
+            Result(
+                port=port,
+                threat=threat,
+                severity=severity,
+                description=result.get("description"),
+                nvt=nvt,
+                qod_value=qod.get("value"),
+                qod_type=qod.get("type"),
+            ),
+            threat_index,
+            int(severity) - 1,
+            port,
+        )
 
     # lists with just one element can be parsed as dict by xmltodict
     if isinstance(results, dict):
@@ -231,19 +278,24 @@ def __create_results_per_host(report: Dict) -> List[Dict]:
     else:
         for result in results:
             per_result(result)
-    threat_count_dict = {
-        __threats[i]: count for i, count in enumerate(threat_count)
-    }
+    # host information are usually after the results
+    host_information_lookup = __create_host_information_lookup(report)
+    hosts = [
+        __finalize_host(
+            host,
+            host_information_lookup.get(hostname, {}).get("os", "unknown"),
+        )
+        for hostname, host in by_host.items()
+    ]
     # sort by amount descending
-    host_threat_count = dict(
-        sorted(
-            host_threat_count.items(),
-            key=lambda x: sum(x[1].values()),
-            reverse=True,
+    host_threat_count = {
+        host.host: __threat_dict(host.threats)
+        for host in sorted(
+            by_host.values(), key=_HostAggregate.total, reverse=True
         )
-    )
+    }
 
-    return list(by_host.values()), host_threat_count, threat_count_dict
+    return hosts, host_threat_count, __threat_dict(threat_count), nvts
 
 
 @measure_time
@@ -260,7 +312,7 @@ def transform(data: Dict[str, str]) -> Report:
 
     task = report.get("task") or {}
     logger.info("data transformation")
-    results, host_counts, nvts_counts = __create_results_per_host(report)
+    results, host_counts, nvts_counts, nvts = __create_results_per_host(report)
 
     return Report(
         report.get("id"),
@@ -271,4 +323,5 @@ def transform(data: Dict[str, str]) -> Report:
             hosts=host_counts, nvts=nvts_counts, vulnerable_equipment=None
         ),
         results,
+        nvts,
     )
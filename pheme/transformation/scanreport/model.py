@@ -17,8 +17,8 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 # pylint: disable=W0614,W0511,W0401,C0103
-from dataclasses import dataclass
-from typing import Dict, List, Union
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Union
 
 
 @dataclass
@@ -29,8 +29,46 @@ class NVTThreatCount:
 
 @dataclass
 class Equipment:
+    __slots__ = ("os", "ports")
     os: str  # search for host.text and refs than os-detection
-    ports: List[str]  # ports port host and ports port text
+    ports: Union[Set[str], List[str]]  # ports port host and ports port text
+
+
+@dataclass
+class Result:
+    """
+    A single result of a host.
+
+    nvt contains the nvt information with the prefix nvt_ (e.g. nvt_oid).
+    Results of the same nvt share the nvt dict of Report.nvts.
+    """
+
+    __slots__ = (
+        "port",
+        "threat",
+        "severity",
+        "description",
+        "nvt",
+        "qod_value",
+        "qod_type",
+    )
+    port: Optional[str]
+    threat: str
+    severity: float
+    description: Optional[str]
+    nvt: Dict[str, Any]
+    qod_value: Optional[str]
+    qod_type: Optional[str]
+
+
+@dataclass
+class Host:
+    __slots__ = ("host", "threats", "severities", "equipment", "results")
+    host: str
+    threats: Dict[str, Union[int, str]]
+    severities: Dict[str, Union[int, str]]
+    equipment: Equipment
+    results: List[Result]
 
 
 @dataclass
@@ -74,7 +112,112 @@ class Report:
     comment: str
     start: str
     overview: Overview
-    results: List[Dict]
+    results: List[Host]
+    # nvt catalogue; nvt information per oid
+    nvts: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+
+def __serialize_result(result: Result, nvts: Dict) -> Dict:
+    oid = result.nvt.get("nvt_oid")
+    # just reference nvts within the catalogue
+    nvt = {"nvt_oid": oid} if oid is not None and oid in nvts else result.nvt
+    return {
+        "port": result.port,
+        "threat": result.threat,
+        "severity": result.severity,
+        "description": result.description,
+        **nvt,
+        "qod_value": result.qod_value,
+        "qod_type": result.qod_type,
+    }
+
+
+def __serialize_host(host: Host, nvts: Dict) -> Dict:
+    return {
+        "host": host.host,
+        "threats": host.threats,
+        "severities": host.severities,
+        "equipment": {
+            "ports": host.equipment.ports,
+            "os": host.equipment.os,
+        },
+        "results": [
+            __serialize_result(result, nvts) for result in host.results
+        ],
+    }
+
+
+def serialize(report: Report) -> Dict:
+    """
+    creates the dict representation of a report as it is stored and used
+    within templates.
+
+    In difference to dataclasses.asdict it does not create deep copies of the
+    values but just creates the dicts for the records.
+
+    Results just contain the nvt_oid of nvts within the nvt catalogue, use
+    resolve to get the nvt information per result.
+    """
+    return {
+        "id": report.id,
+        "name": report.name,
+        "comment": report.comment,
+        "start": report.start,
+        "overview": {
+            "hosts": report.overview.hosts,
+            "nvts": report.overview.nvts,
+            "vulnerable_equipment": report.overview.vulnerable_equipment,
+        },
+        "results": [
+            __serialize_host(host, report.nvts) for host in report.results
+        ],
+        "nvts": report.nvts,
+    }
+
+
+def resolve_result(result: Dict, nvts: Dict) -> Dict:
+    """
+    returns a copy of a stored result with the nvt information of the nvt
+    catalogue in place of nvt_oid.
+
+    >>> nvts = {"1": {"nvt_oid": "1", "nvt_name": "test"}}
+    >>> resolve_result({"port": "80/tcp", "nvt_oid": "1", "qod_value": 1}, nvts)
+    {'port': '80/tcp', 'nvt_oid': '1', 'nvt_name': 'test', 'qod_value': 1}
+    """
+    nvt = nvts.get(result.get("nvt_oid"))
+    if nvt is None:
+        return dict(result)
+    resolved = {}
+    for key, value in result.items():
+        if key == "nvt_oid":
+            resolved.update(nvt)
+        else:
+            resolved[key] = value
+    return resolved
+
+
+def resolve(data: Dict) -> Dict:
+    """
+    returns a copy of a stored report with the nvt information resolved
+    within each result and without the nvt catalogue; this is the data
+    structure used within templates and exports.
+
+    The stored report is not modified.
+    """
+    nvts = data.get("nvts") or {}
+    resolved = {k: v for k, v in data.items() if k != "nvts"}
+    if data.get("results"):
+        resolved["results"] = [
+            {
+                **host,
+                "results": [
+                    resolve_result(result, nvts)
+                    for result in host.get("results") or []
+                ],
+            }
+            for host in data["results"]
+        ]
+    return resolved
 
 
 def describe():
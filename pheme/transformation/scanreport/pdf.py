@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+# pheme/transformation/scanreport/pdf.py
+# Copyright (C) 2021 Greenbone Networks GmbH
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Renders html and css into PDF via WeasyPrint.
+
+Large reports can be rendered in chunks of html. Each chunk is written into
+a PDF of its own and its layout is dropped before the next chunk is
+rendered; the PDF of the chunks are merged via pypdf so that just the PDF of
+the already rendered chunks are kept in memory. The bookmarks of all chunks
+are merged into one outline.
+
+A renderer keeps the state of WeasyPrint which can be reused between
+documents: the font configuration, parsed stylesheets and decoded images
+(e.g. logos).
+
+When PDF_WORKERS is greater than 0 the PDF are rendered within a pool of
+worker processes, each with its own warmed up renderer; otherwise each thread
+renders with its own renderer. The amount of renders waiting for or running
+within the pool is limited by PDF_QUEUE_SIZE; a render is rejected when the
+queue stays full for PDF_QUEUE_TIMEOUT and aborted after PDF_TIMEOUT.
+"""
+import hashlib
+import io
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from weasyprint import CSS, HTML, default_url_fetcher
+from weasyprint.fonts import FontConfiguration
+
+from pheme import blob_store, settings
+from pheme.errors import (
+    PDFRenderingError,
+    PDFRenderingQueueFullError,
+    PDFRenderingTimeoutError,
+)
+
+try:
+    import pypdf
+    from pypdf.generic import Fit
+except ImportError:
+    pypdf = None
+
+logger = logging.getLogger(__name__)
+
+ASSET_SCHEME = "pheme-asset"
+
+# url -> result of a url_fetcher (string and mime_type)
+Assets = Dict[str, Dict]
+# page within a chunk, level, label and distance to the top of the page in pt
+Bookmark = Tuple[int, int, str, float]
+# 1px in pt as used by WeasyPrint
+PX_TO_PT = 0.75
+
+
+def svg_asset(svg: str) -> Tuple[str, Dict]:
+    """
+    returns the url and the url_fetcher result of a svg.
+
+    The url is derived from the content so that the same chart results in
+    the same asset.
+
+    >>> svg_asset("<svg></svg>")[0]
+    'pheme-asset:ab23c1e5bcf37109063f4b1e96e9f271.svg'
+    """
+    digest = hashlib.blake2b(svg.encode(), digest_size=16).hexdigest()
+    url = "{}:{}.svg".format(ASSET_SCHEME, digest)
+    return url, {"string": svg.encode(), "mime_type": "image/svg+xml"}
+
+
+def _url_fetcher(assets: Optional[Assets]):
+    """
+    returns a url_fetcher which serves assets from memory and blobs (e.g.
+    uploaded images) from the blob store and delegates every other url to
+    the default url_fetcher of WeasyPrint.
+    """
+
+    def fetch(url: str) -> Dict:
+        asset = assets.get(url) if assets else None
+        if asset is not None:
+            return dict(asset)
+        blob = blob_store.fetch(url)
+        if blob is not None:
+            return blob
+        return default_url_fetcher(url)
+
+    return fetch
+
+
+class _Renderer:
+    """
+    Keeps the reusable state of WeasyPrint.
+    """
+
+    def __init__(self, max_stylesheets: int = 16, max_images: int = 64):
+        self.font_config = FontConfiguration()
+        self.max_stylesheets = max_stylesheets
+        self.max_images = max_images
+        self.stylesheets: Dict[bytes, CSS] = OrderedDict()
+        self.image_cache: Dict = {}
+
+    def stylesheet(self, css: str) -> CSS:
+        key = hashlib.blake2b(css.encode(), digest_size=16).digest()
+        stylesheet = self.stylesheets.get(key)
+        if stylesheet is None:
+            stylesheet = CSS(string=css, font_config=self.font_config)
+            self.stylesheets[key] = stylesheet
+            if len(self.stylesheets) > self.max_stylesheets:
+                self.stylesheets.popitem(last=False)
+        else:
+            self.stylesheets.move_to_end(key)
+        return stylesheet
+
+    def __html(self, html: str, css: str, assets: Optional[Assets]):
+        # charts are unique per report; keep just a bounded amount of images
+        if len(self.image_cache) > self.max_images:
+            self.image_cache.clear()
+        options = {
+            "stylesheets": [self.stylesheet(css)],
+            "font_config": self.font_config,
+            "image_cache": self.image_cache,
+        }
+        return HTML(string=html, url_fetcher=_url_fetcher(assets)), options
+
+    def render(
+        self, html: str, css: str, assets: Optional[Assets] = None
+    ) -> bytes:
+        document, options = self.__html(html, css, assets)
+        return document.write_pdf(**options)
+
+    def render_chunk(
+        self, html: str, css: str, assets: Optional[Assets] = None
+    ) -> Tuple[bytes, List[Bookmark]]:
+        """
+        renders a chunk into PDF and returns its bookmarks so that the
+        outline of all chunks can be merged.
+        """
+        document, options = self.__html(html, css, assets)
+        document = document.render(**options)
+        bookmarks = [
+            # WeasyPrint < 52 does not add the state of a bookmark
+            (number, bookmark[0], bookmark[1], bookmark[2][1] * PX_TO_PT)
+            for number, page in enumerate(document.pages)
+            for bookmark in page.bookmarks
+        ]
+        return document.write_pdf(), bookmarks
+
+
+def _merge(chunks: Iterable[Tuple[bytes, List[Bookmark]]]) -> bytes:
+    """
+    merges the PDF of chunks into one PDF via pypdf.
+
+    The outlines of the chunks are not imported; instead the bookmarks of
+    all chunks are added to one outline so that e.g. the hosts of each chunk
+    are below the same heading of the first chunk.
+    """
+    writer = pypdf.PdfWriter()
+    # level and outline item of the current parents
+    parents: List[Tuple[int, object]] = []
+    for pdf, bookmarks in chunks:
+        offset = len(writer.pages)
+        writer.append(io.BytesIO(pdf), import_outline=False)
+        for number, level, label, top in bookmarks:
+            while parents and parents[-1][0] >= level:
+                parents.pop()
+            page = offset + number
+            height = float(writer.pages[page].mediabox.top)
+            item = writer.add_outline_item(
+                label,
+                page,
+                parent=parents[-1][1] if parents else None,
+                fit=Fit.xyz(left=0, top=height - top),
+            )
+            parents.append((level, item))
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+class Metrics:
+    """
+    Counts renders and measures the time spent waiting for and rendering PDF.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.renders = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.render_seconds = 0.0
+
+    def add(self, name: str, amount=1):
+        with self.__lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def as_dict(self) -> Dict:
+        return {
+            "renders": self.renders,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "wait_seconds": self.wait_seconds,
+            "render_seconds": self.render_seconds,
+        }
+
+
+metrics = Metrics()
+
+# renderer of a worker process
+__worker_renderer: Optional[_Renderer] = None  # pylint: disable=invalid-name
+
+
+def __init_worker():
+    # pylint: disable=global-statement,invalid-name
+    global __worker_renderer
+    __worker_renderer = _Renderer()
+    # loads the fonts so that the first report does not need to
+    __worker_renderer.render("<p>pheme</p>", "p { font-family: sans-serif }")
+
+
+def __render_in_worker(
+    method: str, html: str, css: str, assets: Optional[Assets]
+) -> Tuple[Union[bytes, Tuple[bytes, List[Bookmark]]], float]:
+    started = time.monotonic()
+    pdf = getattr(__worker_renderer, method)(html, css, assets)
+    return pdf, time.monotonic() - started
+
+
+__thread_local = threading.local()
+
+
+def __render_in_thread(
+    method: str, html: str, css: str, assets: Optional[Assets]
+) -> Union[bytes, Tuple[bytes, List[Bookmark]]]:
+    renderer = getattr(__thread_local, "renderer", None)
+    if renderer is None:
+        renderer = _Renderer()
+        __thread_local.renderer = renderer
+    return getattr(renderer, method)(html, css, assets)
+
+
+# pylint: disable=invalid-name
+__pool: Optional[ProcessPoolExecutor] = None
+__pool_lock = threading.Lock()
+__queue: Optional[threading.BoundedSemaphore] = None
+# pylint: enable=invalid-name
+
+
+def __worker_pool() -> Tuple[ProcessPoolExecutor, threading.BoundedSemaphore]:
+    # pylint: disable=global-statement,invalid-name
+    global __pool, __queue
+    with __pool_lock:
+        if __pool is None:
+            __pool = ProcessPoolExecutor(
+                max_workers=settings.PDF_WORKERS, initializer=__init_worker
+            )
+            # starts and warms up the workers upfront
+            for _ in range(settings.PDF_WORKERS):
+                __pool.submit(time.sleep, 0)
+        if __queue is None:
+            __queue = threading.BoundedSemaphore(
+                max(settings.PDF_QUEUE_SIZE, settings.PDF_WORKERS)
+            )
+        return __pool, __queue
+
+
+def __reset_pool(broken: ProcessPoolExecutor):
+    # pylint: disable=global-statement,invalid-name
+    global __pool
+    with __pool_lock:
+        if __pool is broken:
+            __pool = None
+    broken.shutdown(wait=False)
+
+
+def __render_in_pool(
+    method: str, html: str, css: str, assets: Optional[Assets]
+) -> Union[bytes, Tuple[bytes, List[Bookmark]]]:
+    pool, queue = __worker_pool()
+    timeout = settings.PDF_TIMEOUT
+    started = time.monotonic()
+    if not queue.acquire(timeout=settings.PDF_QUEUE_TIMEOUT):
+        metrics.add("rejected")
+        raise PDFRenderingQueueFullError("PDF rendering queue is full")
+    try:
+        future = pool.submit(__render_in_worker, method, html, css, assets)
+    except BrokenProcessPool as e:
+        queue.release()
+        __reset_pool(pool)
+        raise PDFRenderingError("PDF rendering pool is broken") from e
+    # the slot is freed when the render is done, even after a timeout
+    future.add_done_callback(lambda _: queue.release())
+    try:
+        pdf, render_seconds = future.result(timeout=timeout)
+    except FutureTimeoutError as e:
+        metrics.add("timeouts")
+        raise PDFRenderingTimeoutError(
+            "PDF rendering took longer than {}s".format(timeout)
+        ) from e
+    except BrokenProcessPool as e:
+        __reset_pool(pool)
+        raise PDFRenderingError("PDF rendering pool is broken") from e
+    metrics.add("wait_seconds", time.monotonic() - started - render_seconds)
+    metrics.add("render_seconds", render_seconds)
+    return pdf
+
+
+def write_pdf(
+    html: Union[str, Iterable[str]],
+    css: str,
+    assets: Optional[Assets] = None,
+) -> bytes:
+    """
+    renders html with the stylesheet css into PDF.
+
+    html is either a document or an iterable of documents (chunks) which are
+    laid out one after another. Each chunk is rendered into a PDF on its own
+    (within a worker when PDF_WORKERS is set) and the PDF are merged into
+    one with a shared outline; links between chunks are not kept and
+    PDF_TIMEOUT applies to each chunk.
+
+    assets contains the content of urls (e.g. charts created via svg_asset)
+    which are served from memory instead of being fetched.
+
+    Raises PDFRenderingQueueFullError when the rendering queue stays full,
+    PDFRenderingTimeoutError when a render did not finish within PDF_TIMEOUT
+    and PDFRenderingError otherwise (e.g. chunks without pypdf).
+    """
+    if not isinstance(html, str) and pypdf is None:
+        raise PDFRenderingError(
+            "rendering a PDF in chunks (limits.pdf.hosts_per_chunk) "
+            "requires pypdf"
+        )
+    started = time.monotonic()
+    render = (
+        __render_in_pool if settings.PDF_WORKERS > 0 else __render_in_thread
+    )
+    try:
+        if isinstance(html, str):
+            pdf = render("render", html, css, assets)
+        else:
+            pdf = _merge(
+                render("render_chunk", chunk, css, assets) for chunk in html
+            )
+        if settings.PDF_WORKERS <= 0:
+            metrics.add("render_seconds", time.monotonic() - started)
+    except Exception:
+        metrics.add("failures")
+        raise
+    metrics.add("renders")
+    logger.debug(
+        "rendered pdf of %d bytes in %.3fs",
+        len(pdf),
+        time.monotonic() - started,
+    )
+    return pdf
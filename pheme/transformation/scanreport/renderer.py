@@ -16,20 +16,22 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import itertools
 import logging
-from typing import Dict
+from typing import Dict, Iterator
 
-from base64 import b64encode
-
-from django.core.cache import cache
 from django.template import Template, Context
 from rest_framework import renderers
 from rest_framework.request import Request
-from weasyprint import CSS, HTML
-from pheme.settings import DEBUG
+from pheme import blob_store, settings
+from pheme.datalink import as_datalink
 from pheme.parameter import load_params
 from pheme.authentication import get_username_role
 from pheme.errors import TemplateNotFoundError
+from pheme.render_cache import render_cache
+from pheme.template_cache import compile_template
+from pheme.transformation.scanreport import store as report_store
+from pheme.transformation.scanreport.pdf import Assets, svg_asset, write_pdf
 
 logger = logging.getLogger(__name__)
 
@@ -40,7 +42,7 @@ def _load_template(name: str, params: Dict = None) -> Template:
     templ = params.get(name)
     if not templ:
         raise TemplateNotFoundError(name)
-    return Template(templ)
+    return compile_template(templ)
 
 
 def _enrich(name: str, data: Dict, parameter: Dict) -> Dict:
@@ -69,26 +71,35 @@ class Report(renderers.BaseRenderer):
         request = _get_request(renderer_context)
         if not data:
             return _default_not_found_response(renderer_context, request)
+        username, _ = get_username_role(request)
+        return self.cached_apply(
+            data, username=username, query=dict(request.query_params)
+        )
 
-        name = data.get("internal_name")
-        cache_key = "{}/{}".format(self.media_type, name) if name else None
-        logger.debug("generating report %s", cache_key)
+    def cached_apply(
+        self, data: Dict, *, username: str = None, query: Dict = None
+    ):
+        """
+        applies the parameter of username to data or returns the already
+        rendered report from the render cache.
 
-        if cache_key and not DEBUG:
-            cached = cache.get(cache_key)
-            if cached:
-                return cached
+        Is used without username and query to pre-render a report.
+        """
+        name = data.get("internal_name")
         params = load_params()
         # separate user specific parameter
         user_parameter = params.pop("user_specific", {})
-        username, _ = get_username_role(request)
         if username:
             params = {**params, **user_parameter.get(username, {})}
+        cache_key = render_cache.key(self.media_type, name, params, query or {})
+        logger.debug("generating report %s", cache_key)
+        cached = render_cache.get(cache_key)
+        if cached:
+            return cached
         data["version"] = params.get("version")
 
         result = self.apply(name, data, params)
-        if cache_key:
-            cache.set(cache_key, result)
+        render_cache.set(cache_key, result)
         return result
 
     def apply(self, name: str, data: Dict, parameter: Dict):
@@ -97,6 +108,35 @@ class Report(renderers.BaseRenderer):
         )
 
 
+def _blob_url(value: str) -> str:
+    """
+    returns the absolute url of the blob view for a blob reference when
+    BLOB_BASE_URL is set so that a browser loads and caches an image instead
+    of getting it within each report; otherwise the data link of the blob so
+    that a downloaded report is still self-contained.
+    """
+    if settings.BLOB_BASE_URL:
+        return "{}/blob/{}".format(
+            settings.BLOB_BASE_URL.rstrip("/"), blob_store.blob_id_of(value)
+        )
+    blob = blob_store.fetch(value)
+    if blob is None:
+        return value
+    return as_datalink(blob["string"], blob["mime_type"])
+
+
+def _with_blob_urls(parameter: Dict) -> Dict:
+    """
+    replaces references to blobs (e.g. uploaded images) with urls a browser
+    is able to load.
+    """
+    with_urls = dict(parameter)
+    for key, value in parameter.items():
+        if blob_store.blob_id_of(value):
+            with_urls[key] = _blob_url(value)
+    return with_urls
+
+
 class VulnerabilityHTMLReport(Report):
     __template = "vulnerability_report_html_template"
     __css_template = "vulnerability_report_html_css"
@@ -104,6 +144,7 @@ class VulnerabilityHTMLReport(Report):
     format = "html"
 
     def apply(self, name: str, data: Dict, parameter: Dict):
+        parameter = _with_blob_urls(parameter)
         css = _load_template(self.__css_template, parameter).render(
             Context(parameter)
         )
@@ -114,39 +155,51 @@ class VulnerabilityHTMLReport(Report):
         )
 
 
-def _replace_inline_svg_with_img_tags(
-    html: str, from_index: int = 0, open_tag="<svg ", close_tag="</svg>"
+def _extract_svg_assets(
+    html: str,
+    assets: Assets,
+    open_tag: str = "<svg ",
+    close_tag: str = "</svg>",
 ) -> str:
     """
     Is a workaround because WeasyPrint is not capable of dealing with inline svg
 
-    It searches for svg tags and replaces the inline svg within a given
-    html document with img containing a base64 encoded data link.
+    It searches for svg tags and replaces each inline svg within a given html
+    document with an img referencing it as an asset; the svg is added to
+    assets and served to WeasyPrint via its url_fetcher.
 
     It is known that we lose the css styling with that hack, but in the moment
     it is considered better than losing the image altogether or trying to
     produce the images before rendering the template.
 
-    Please replace this method as soon as possible with a proper solution.
+    The html is just scanned once and joined at the end.
+
+    >>> assets = {}
+    >>> _extract_svg_assets('<p><svg a="1"></svg></p>', assets)
+    '<p><img src="pheme-asset:41ca595d35f4152d79b074ae370fedd5.svg" /></p>'
+    >>> list(assets.values())[0]["string"]
+    b'<svg a="1"></svg>'
     """
+    parts = []
+    position = 0
     # abort condition is when either open_tag or close_tag was not found
     while True:
-        from_index = html.find(open_tag, from_index)
+        from_index = html.find(open_tag, position)
         if from_index == -1:
-            return html
+            break
         to_index = html.find(close_tag, from_index + len(open_tag))
         if to_index == -1:
-            return html
+            break
         to_index += len(close_tag)
-        to_encode = html[from_index:to_index]
-        encoded = b64encode(to_encode.encode()).decode()
-        img = (
-            '<img src="data:image/svg+xml;charset=utf-8;base64, {}" />'.format(
-                encoded
-            )
-        )
-        html = html[:from_index] + img + html[to_index:]
-        from_index = to_index
+        url, asset = svg_asset(html[from_index:to_index])
+        assets[url] = asset
+        parts.append(html[position:from_index])
+        parts.append('<img src="{}" />'.format(url))
+        position = to_index
+    if not parts:
+        return html
+    parts.append(html[position:])
+    return "".join(parts)
 
 
 def enforce_limit(
@@ -190,11 +243,50 @@ def enforce_limit(
     return data
 
 
+def _render_chunks(
+    template: Template,
+    name: str,
+    data: Dict,
+    parameter: Dict,
+    hosts_per_chunk: int,
+    assets: Assets,
+) -> Iterator[str]:
+    """
+    renders the report in sections of hosts_per_chunk hosts.
+
+    Each section contains `chunk` with the keys index, first, last and
+    offset (of the first host within the section). A template has to render
+    e.g. the cover and overview just within the first chunk (chunk.first);
+    otherwise they are repeated within each chunk.
+
+    The hosts of a stored report are loaded per chunk and are not kept
+    afterwards. The charts of each chunk are added to assets.
+    """
+    hosts = iter(report_store.hosts(data))
+    offsets = range(0, len(data["results"]), hosts_per_chunk)
+    for index, offset in enumerate(offsets):
+        chunk = {
+            **data,
+            "results": list(itertools.islice(hosts, hosts_per_chunk)),
+            "chunk": {
+                "index": index,
+                "first": index == 0,
+                "last": index == len(offsets) - 1,
+                "offset": offset,
+            },
+        }
+        html = template.render(Context(_enrich(name, chunk, parameter)))
+        yield _extract_svg_assets(html, assets)
+
+
 class VulnerabilityPDFReport(Report):
     """
     Is used to generate vulnerability reports in PDF.
     It renders html and css templates given data struct and then translate
     the html document to PDF
+
+    When limits.pdf.hosts_per_chunk is set and the report contains more
+    hosts the html is rendered and laid out in chunks of hosts.
     """
 
     __template = "vulnerability_report_pdf_template"
@@ -208,10 +300,28 @@ class VulnerabilityPDFReport(Report):
             Context(parameter)
         )
         html_template = _load_template(self.__template, parameter)
+        hosts_per_chunk = (
+            parameter.get("limits", {}).get("pdf", {}).get("hosts_per_chunk")
+        )
+        assets = {}
+        if hosts_per_chunk and len(data.get("results") or []) > hosts_per_chunk:
+            logger.debug("creating pdf in chunks of %s hosts", hosts_per_chunk)
+            return write_pdf(
+                _render_chunks(
+                    html_template,
+                    name,
+                    data,
+                    parameter,
+                    hosts_per_chunk,
+                    assets,
+                ),
+                css,
+                assets,
+            )
         html = html_template.render(Context(_enrich(name, data, parameter)))
-        html = _replace_inline_svg_with_img_tags(html)
+        html = _extract_svg_assets(html, assets)
         logger.debug("created html")
-        pdf = HTML(string=html).write_pdf(stylesheets=[CSS(string=css)])
+        pdf = write_pdf(html, css, assets)
         logger.debug("created pdf")
         return pdf
 
@@ -224,7 +334,7 @@ class ReportFormatHTMLReport(renderers.BaseRenderer):
         request = _get_request(renderer_context)
         if not data:
             return _default_not_found_response(renderer_context, request)
-        template = Template(data["template"])
+        template = compile_template(data["template"])
         data["vulnerability_report"]["css"] = data["html_css"]
         data["vulnerability_report"]["images"] = data.get("images")
         context = Context(data["vulnerability_report"])
@@ -242,11 +352,11 @@ class ReportFormatPDFReport(renderers.BaseRenderer):
         if not data:
             return _default_not_found_response(renderer_context, request)
         data["vulnerability_report"]["images"] = data.get("images")
-        template = Template(data["template"])
+        template = compile_template(data["template"])
         context = Context(data["vulnerability_report"])
         html = template.render(context)
         logger.debug("created html")
-        css = Template(data["pdf_css"]).render(context)
-        pdf = HTML(string=html).write_pdf(stylesheets=[CSS(string=css)])
+        css = compile_template(data["pdf_css"]).render(context)
+        pdf = write_pdf(html, css)
         logger.debug("created pdf")
         return pdf
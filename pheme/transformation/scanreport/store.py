@@ -0,0 +1,490 @@
+# -*- coding: utf-8 -*-
+# pheme/transformation/scanreport/store.py
+# Copyright (C) 2021 Greenbone Networks GmbH
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Stores serialized scan reports in an indexed file per report which gets
+memory mapped when loaded.
+
+The file is written once (append-only) and consists of:
+
+- MAGIC
+- a section containing the report without results and nvts (e.g. overview)
+- a section containing the nvt catalogue
+- a section containing the nvt information of results without an entry
+  within the nvt catalogue (e.g. without an oid); just one per distinct set
+  of keys and tags is kept since it is used to know the columns of an export
+- a section per host
+- the index containing offset and length of each section
+- the trailer containing offset and length of the index
+
+Each section is pickled without compression so that a host can be loaded by
+just reading its section; the mapped pages are shared by all processes via
+the page cache.
+
+A loaded report contains the results as a HostSequence which loads and
+resolves a host on the first access. Hosts which are not accessed (e.g. due
+to enforce_limit) are never loaded.
+"""
+import itertools
+import mmap
+import os
+import pickle
+import struct
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from pathlib import Path
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from django.core.cache import cache
+
+from pheme import settings
+from pheme.storage import load as load_from_cache
+from pheme.transformation.scanreport.model import resolve, resolve_result
+
+MAGIC = b"PHEMERS2"
+# files written before the section of uncatalogued nvts was added
+MAGIC_WITHOUT_UNCATALOGUED_NVTS = b"PHEMERS1"
+__trailer = struct.Struct("<QQ8s")
+
+
+def __path(name: str) -> Path:
+    return Path(settings.REPORT_STORE_PATH).joinpath("{}.report".format(name))
+
+
+def __is_expired(path: Path, now: float) -> bool:
+    timeout = settings.REPORT_STORE_TIMEOUT
+    try:
+        return timeout is not None and path.stat().st_mtime + timeout < now
+    except FileNotFoundError:
+        return True
+
+
+def __remove_expired(directory: Path):
+    now = time.time()
+    for path in directory.glob("*.report"):
+        if __is_expired(path, now):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                # may be removed by another process
+                pass
+
+
+def __uncatalogued_nvts(stored_hosts: List[Dict]) -> List[Dict]:
+    """
+    returns the nvt information of results which contain it instead of
+    referencing the nvt catalogue; one per distinct set of keys and tags.
+
+    >>> __uncatalogued_nvts([{"results": [
+    ...     {"port": "1", "nvt_oid": "1"},
+    ...     {"port": "2", "nvt_name": "a"},
+    ...     {"port": "3", "nvt_name": "b"},
+    ... ]}])
+    [{'nvt_name': 'a'}]
+    """
+    by_columns = {}
+    for host in stored_hosts:
+        for result in host.get("results") or []:
+            nvt = {k: v for k, v in result.items() if k.startswith("nvt_")}
+            if nvt.keys() - {"nvt_oid"}:
+                tags = nvt.get("nvt_tags_interpreted") or {}
+                by_columns.setdefault((tuple(nvt), tuple(tags)), nvt)
+    return list(by_columns.values())
+
+
+def store_handler(name: str, value: Dict):
+    """
+    writes a serialized report into the report store.
+
+    Can be used as a handler for pheme.storage.store.
+    """
+    path = __path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    __remove_expired(path.parent)
+    meta = {k: v for k, v in value.items() if k not in ("results", "nvts")}
+    stored_hosts = list(value.get("results") or [])
+    sections = [meta, value.get("nvts") or {}]
+    sections += [__uncatalogued_nvts(stored_hosts), *stored_hosts]
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent)
+    try:
+        with open(fd, "wb") as f:
+            f.write(MAGIC)
+            index: List[Tuple[int, int]] = []
+            for section in sections:
+                data = pickle.dumps(section, pickle.HIGHEST_PROTOCOL)
+                index.append((f.tell(), len(data)))
+                f.write(data)
+            index_data = pickle.dumps(index, pickle.HIGHEST_PROTOCOL)
+            index_offset = f.tell()
+            f.write(index_data)
+            f.write(__trailer.pack(index_offset, len(index_data), MAGIC))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+class HostSequence(Sequence):
+    """
+    Sequence of the hosts of a stored report.
+
+    A host is loaded and its results are resolved on the first access;
+    afterwards the same dict is returned so that changes (e.g. removing
+    results) are kept.
+    """
+
+    def __init__(
+        self,
+        buffer: mmap.mmap,
+        index: List[Tuple[int, int]],
+        load_nvts: Callable[[], Dict],
+        uncatalogued_nvts: List[Dict],
+    ):
+        self.__buffer = buffer
+        self.__index = index
+        self.__load_nvts = load_nvts
+        self.__uncatalogued_nvts = uncatalogued_nvts
+        self.__hosts: Dict[int, Dict] = {}
+
+    def view(self) -> "HostSequence":
+        """
+        returns a sequence of the same stored report sharing the mapped file
+        and the nvt catalogue but not the loaded hosts.
+        """
+        return HostSequence(
+            self.__buffer,
+            self.__index,
+            self.__load_nvts,
+            self.__uncatalogued_nvts,
+        )
+
+    def __len__(self) -> int:
+        return len(self.__index)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("host index out of range")
+        host = self.__hosts.get(index)
+        if host is None:
+            host = self.__load(index)
+            self.__hosts[index] = host
+        return host
+
+    def __load(self, index: int) -> Dict:
+        offset, length = self.__index[index]
+        host = pickle.loads(self.__buffer[offset : offset + length])
+        catalogue = self.__load_nvts()
+        host["results"] = [
+            resolve_result(result, catalogue)
+            for result in host.get("results") or []
+        ]
+        return host
+
+    def nvts(self) -> Dict:
+        """
+        returns the nvt catalogue of the report.
+        """
+        return self.__load_nvts()
+
+    def uncatalogued_nvts(self) -> List[Dict]:
+        """
+        returns the nvt information of results without an entry within the
+        nvt catalogue; one per distinct set of keys and tags.
+        """
+        return self.__uncatalogued_nvts
+
+    def stream(self) -> Iterator[Dict]:
+        """
+        yields each host without keeping it afterwards so that just a single
+        host is in memory at a time (e.g. for a streaming export).
+
+        Already accessed hosts are yielded as they are.
+        """
+        for index in range(len(self)):
+            host = self.__hosts.get(index)
+            yield host if host is not None else self.__load(index)
+
+
+def __open(path: Path) -> Optional[Dict]:
+    with path.open("rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    index_offset, index_length, magic = __trailer.unpack(
+        buffer[-__trailer.size :]
+    )
+    if magic not in (MAGIC, MAGIC_WITHOUT_UNCATALOGUED_NVTS):
+        return None
+    if buffer[: len(magic)] != magic:
+        return None
+    index = pickle.loads(buffer[index_offset : index_offset + index_length])
+
+    def load_section(position: int):
+        offset, length = index[position]
+        return pickle.loads(buffer[offset : offset + length])
+
+    catalogue = []
+
+    def load_nvts() -> Dict:
+        if not catalogue:
+            catalogue.append(load_section(1))
+        return catalogue[0]
+
+    report = load_section(0)
+    if magic == MAGIC_WITHOUT_UNCATALOGUED_NVTS:
+        report["results"] = HostSequence(buffer, index[2:], load_nvts, [])
+    else:
+        report["results"] = HostSequence(
+            buffer, index[3:], load_nvts, load_section(2)
+        )
+    return report
+
+
+def load_handler(name: str) -> Optional[Dict]:
+    """
+    loads a report from the report store with lazily loaded hosts and
+    resolved nvt information or returns None when it does not exist.
+    """
+    path = __path(name)
+    if __is_expired(path, time.time()):
+        return None
+    try:
+        return __open(path)
+    except (FileNotFoundError, ValueError, struct.error):
+        return None
+
+
+def _loaded(stored: Dict) -> Dict:
+    """
+    returns the report of a request from a cached report.
+
+    A report of the report store gets a HostSequence of its own so that
+    loaded hosts are not kept within the cache; a report of the cache gets
+    resolved which creates new hosts and results. Changing the returned
+    report (e.g. removing the overview or results of a host) therefore does
+    not change the cached report.
+
+    >>> stored = {"results": [{"host": "a", "results": [{}, {}]}]}
+    >>> loaded = _loaded(stored)
+    >>> loaded["results"][0]["results"] = []
+    >>> len(stored["results"][0]["results"])
+    2
+    """
+    results = stored.get("results")
+    if isinstance(results, HostSequence):
+        return {**stored, "results": results.view()}
+    return resolve(stored)
+
+
+def _sizeof(value) -> int:
+    """
+    returns the memory used by value including the values it contains; of a
+    HostSequence just the nvt catalogue is counted since it does not keep
+    its hosts within the cache.
+
+    >>> _sizeof({"a": ["b" * 1000]}) > 1000
+    True
+    """
+    seen = set()
+    size = 0
+    pending = [value]
+    while pending:
+        value = pending.pop()
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+        size += sys.getsizeof(value)
+        if isinstance(value, dict):
+            pending.extend(value.keys())
+            pending.extend(value.values())
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            pending.extend(value)
+        elif isinstance(value, HostSequence):
+            pending.append(value.nvts())
+    return size
+
+
+class ReportCache:
+    """
+    LRU cache of stored reports of a process bounded by the amount of
+    reports (maxsize) and their summed memory usage (maxbytes).
+
+    The cached reports are not resolved (see _loaded) and must not be
+    modified.
+    """
+
+    def __init__(self, maxsize: int = 8, maxbytes: int = 256 * 1024 * 1024):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self.__reports: Dict[str, Tuple[Dict, int]] = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[Dict]:
+        with self.__lock:
+            cached = self.__reports.get(name)
+            if cached is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.__reports.move_to_end(name)
+            return cached[0]
+
+    def put(self, name: str, report: Dict):
+        """
+        caches a stored report; a report using more than maxbytes is not
+        cached.
+        """
+        if self.maxsize <= 0:
+            return
+        nbytes = _sizeof(report)
+        if nbytes > self.maxbytes:
+            return
+        with self.__lock:
+            self.__remove(name)
+            self.__reports[name] = (report, nbytes)
+            self.nbytes += nbytes
+            while (
+                len(self.__reports) > self.maxsize
+                or self.nbytes > self.maxbytes
+            ):
+                _, (_, removed) = self.__reports.popitem(last=False)
+                self.nbytes -= removed
+
+    def __remove(self, name: str):
+        # must be called while locked
+        cached = self.__reports.pop(name, None)
+        if cached is not None:
+            self.nbytes -= cached[1]
+
+    def remove(self, name: str):
+        with self.__lock:
+            self.__remove(name)
+
+    def info(self) -> Dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.__reports),
+            "maxsize": self.maxsize,
+            "nbytes": self.nbytes,
+            "maxbytes": self.maxbytes,
+        }
+
+    def clear(self):
+        with self.__lock:
+            self.__reports.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+
+report_cache = ReportCache(
+    settings.REPORT_CACHE_SIZE, settings.REPORT_CACHE_BYTES
+)
+
+
+def __is_removed(name: str, stored: Dict) -> bool:
+    """
+    returns True when a report kept within the report_cache is expired or
+    removed within the report store or, for a report of the cache, within
+    the cache. has_key just reads the expiry of a cached value.
+    """
+    if isinstance(stored.get("results"), HostSequence):
+        return __is_expired(__path(name), time.time())
+    return not cache.has_key(name)
+
+
+def load(name: str) -> Optional[Dict]:
+    """
+    loads a report either from the report store or, when it is not available
+    within the report store, from the cache.
+
+    The nvt information are resolved within both cases. A stored report is
+    kept within the report_cache so that loading it again within the process
+    does not need to read it again; only its hosts are read and resolved again
+    on each load.
+    """
+    stored = report_cache.get(name)
+    if stored is not None and __is_removed(name, stored):
+        report_cache.remove(name)
+        stored = None
+    if stored is None:
+        stored = load_handler(name)
+        if stored is None:
+            stored = load_from_cache(name)
+            if stored is None:
+                return None
+        report_cache.put(name, stored)
+    return _loaded(stored)
+
+
+def hosts(report: Dict) -> Iterable[Dict]:
+    """
+    returns the hosts of a loaded report for a single iteration without
+    keeping lazily loaded hosts.
+    """
+    results = report.get("results") or []
+    if isinstance(results, HostSequence):
+        return results.stream()
+    return results
+
+
+def nvts(report: Dict) -> Iterable[Dict]:
+    """
+    returns the nvt information used within a loaded report.
+
+    Results without an entry within the nvt catalogue are represented by
+    one nvt information per distinct set of keys and tags. Reports which
+    are loaded from the cache do not contain an nvt catalogue
+    anymore; the resolved results contain the nvt information instead.
+    """
+    results = report.get("results") or []
+    if isinstance(results, HostSequence):
+        return itertools.chain(
+            results.nvts().values(), results.uncatalogued_nvts()
+        )
+    return (
+        result for host in results for result in host.get("results") or []
+    )
+
+
+def materialize(report: Dict) -> Dict:
+    """
+    loads all hosts of a report; is used for renderer which need plain
+    lists (e.g. JSON, XML and CSV).
+    """
+    if isinstance(report.get("results"), HostSequence):
+        report["results"] = list(report["results"])
+    return report
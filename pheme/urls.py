@@ -49,12 +49,19 @@ urlpatterns = [
     path("unmodified", pheme.views.unmodified, name="unmodified"),
     path("transform", pheme.views.transform, name="transform"),
     path("transform/", pheme.views.transform),
+    path(
+        "transform/jobs/<str:job_id>",
+        pheme.views.transform_job,
+        name="transform_job",
+    ),
     path(
         "scanreport/data/description",
         pheme.views.scanreport_data_description,
         name="scanreport_data_description",
     ),
     path("report/<str:name>", pheme.views.report, name="report"),
+    path("blob/<str:blob_id>", pheme.views.blob, name="blob"),
+    path("metrics", pheme.views.metrics, name="metrics"),
     path(
         "template/elements/<str:name>",
         pheme.views.template_elements,
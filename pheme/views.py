@@ -17,24 +17,56 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import dataclasses
+import shutil
+import tempfile
+from typing import Dict, Optional
 import rest_framework.renderers
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    StreamingHttpResponse,
+)
 from rest_framework.decorators import api_view, parser_classes, renderer_classes
 from rest_framework.response import Response
 from rest_framework.request import Request
 
 
-from pheme.parser.xml import XMLFormParser, XMLParser
+from pheme import blob_store, jobs, settings
+from pheme.errors import PDFRenderingQueueFullError, PDFRenderingTimeoutError
+from pheme.render_cache import render_cache
+from pheme.template_cache import template_cache
+from pheme.parser.xml import (
+    XMLParser,
+    XMLStreamFormParser,
+    XMLStreamParser,
+    find_xml_upload,
+    iterparse_report,
+)
 from pheme.transformation import scanreport
 from pheme.storage import store, load
-from pheme.renderer import MarkDownTableRenderer, XMLRenderer, CSVRenderer
-from pheme.transformation.scanreport import model
+from pheme.renderer import (
+    COLUMNAR_RENDERERS,
+    MarkDownTableRenderer,
+    XMLRenderer,
+    CSVRenderer,
+    StreamingRenderer,
+)
+from pheme.transformation.scanreport import model, pdf
+from pheme.transformation.scanreport import store as report_store
 from pheme.version import __version__
 
 
 @api_view(["GET"])
 @renderer_classes([rest_framework.renderers.JSONRenderer])
 def load_cache(request, key):
-    return Response(load(key))
+    value = load(key)
+    if value is None:
+        # transformed reports are stored within the report store
+        value = report_store.load(key)
+        if value is not None:
+            value = report_store.materialize(value)
+    return Response(value)
 
 
 @api_view(["POST"])
@@ -53,14 +85,123 @@ def store_cache(request):
 
 
 @api_view(["POST"])
-@parser_classes([XMLParser, XMLFormParser])
+@parser_classes([XMLStreamParser, XMLStreamFormParser])
 @renderer_classes([rest_framework.renderers.JSONRenderer])
 def transform(request):
+    """
+    transforms a gvmd report and returns the name of the stored result.
+
+    With async=1 the uploaded report is spooled into a temporary file and
+    transformed by a background job instead; the job id is returned
+    immediately and the state can be polled via transform/jobs/<id>.
+    """
+    if request.query_params.get("async", "").lower() in ("1", "true"):
+        upload = __spool_upload(request)
+        if upload is None:
+            return Response("missing report", status=400)
+        return Response(
+            jobs.submit("transform", __transform_job, upload), status=202
+        )
+    return Response(__transform(request.data))
+
+
+@api_view(["GET"])
+@renderer_classes([rest_framework.renderers.JSONRenderer])
+def transform_job(request, job_id: str):
+    state = jobs.state(job_id)
+    if state is None:
+        return Response(state, status=404)
+    return Response(state)
+
+
+def __transform(data) -> str:
     name = store(
         "scanreport",
-        dataclasses.asdict(scanreport.gvmd.transform(request.data)),
+        model.serialize(scanreport.gvmd.transform(data)),
+        handler=report_store.store_handler,
     )
-    return Response(name)
+    if settings.PRE_RENDER:
+        jobs.submit("pre-render", __pre_render, name)
+    return name
+
+
+# renderer of report which can be rendered in advance
+__PRE_RENDERER = {
+    renderer.media_type: renderer
+    for renderer in [
+        scanreport.renderer.VulnerabilityHTMLReport,
+        scanreport.renderer.VulnerabilityPDFReport,
+    ]
+}
+
+
+def __report_data(name: str) -> Optional[Dict]:
+    data = report_store.load(name)
+    if data is not None:
+        data["pheme_version"] = int("".join(filter(str.isdigit, __version__)))
+    return data
+
+
+def __pre_render(progress: jobs.Progress, name: str) -> str:
+    """
+    renders a report for each media type of PRE_RENDER into the render cache
+    so that the first download of a user without user specific parameter
+    is a cache hit.
+    """
+    media_types = [m for m in settings.PRE_RENDER if m in __PRE_RENDERER]
+    for i, media_type in enumerate(media_types):
+        data = __report_data(name)
+        if data is None:
+            break
+        __PRE_RENDERER[media_type]().cached_apply(data)
+        progress((i + 1) * 100 / len(media_types))
+    return name
+
+
+def __spool_upload(request: Request):
+    """
+    copies the uploaded report into a temporary file so that it is still
+    available after the request got answered.
+    """
+    if request.content_type.startswith("multipart/form-data"):
+        # bypass the parser of the view; django handles the upload itself
+        # pylint: disable=W0212
+        source = find_xml_upload(request._request)
+    else:
+        source = request.stream
+    if source is None:
+        return None
+    upload = tempfile.TemporaryFile()
+    shutil.copyfileobj(source, upload)
+    upload.seek(0)
+    return upload
+
+
+class _ProgressReader:
+    """
+    Reports the share of read bytes of a file as progress.
+    """
+
+    def __init__(self, file, size: int, progress):
+        self.file = file
+        self.size = size or 1
+        self.position = 0
+        self.progress = progress
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.file.read(size)
+        self.position += len(data)
+        self.progress(self.position * 100 / self.size)
+        return data
+
+
+def __transform_job(progress: jobs.Progress, upload) -> str:
+    with upload:
+        size = upload.seek(0, 2)
+        upload.seek(0)
+        return __transform(
+            iterparse_report(_ProgressReader(upload, size, progress))
+        )
 
 
 @api_view(["POST"])
@@ -98,6 +239,7 @@ def template_elements(request: Request, name: str):
         scanreport.renderer.VulnerabilityPDFReport,
         XMLRenderer,
         CSVRenderer,
+        *COLUMNAR_RENDERERS,
     ]
 )
 def report(request: Request, name: str):
@@ -110,23 +252,89 @@ def report(request: Request, name: str):
         return Response(
             {
                 "template": load_value_of("{}html_template".format(name)),
-                "vulnerability_report": load(name),
+                "vulnerability_report": report_store.load(name) or {},
                 "pdf_css": load_value_of("{}pdf_css".format(name)),
                 "html_css": load_value_of("{}html_css".format(name)),
                 "images": images,
             }
         )
-    data = load(name)
-    data["pheme_version"] = int("".join(filter(str.isdigit, __version__)))
+    data = __report_data(name)
+    if data is None:
+        return Response(data)
+    renderer = request.accepted_renderer
+    streamed = isinstance(renderer, StreamingRenderer)
+    if not streamed and not isinstance(renderer, scanreport.renderer.Report):
+        # just template based renderer are able to load hosts lazily
+        data = report_store.materialize(data)
     if request.GET.get("without_overview"):
         # remove charts
         data.pop("overview", None)
-    if request.META.get("HTTP_ACCEPT") == "application/xml":
-        # XML needs exactly one root
-        data = {"report": data}
+    if streamed:
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += "; charset={}".format(renderer.charset)
+        return StreamingHttpResponse(
+            renderer.stream(
+                data, report_store.hosts(data), report_store.nvts(data)
+            ),
+            content_type=content_type,
+        )
+    if isinstance(renderer, scanreport.renderer.Report):
+        return __render_report(request, data)
     return Response(data)
 
 
+def __render_report(request: Request, data: Dict):
+    """
+    renders a template based report within the view so that a full PDF
+    rendering queue is answered with 503 and a PDF render exceeding
+    PDF_TIMEOUT with 504 instead of an internal server error.
+    """
+    response = Response(data)
+    response.accepted_renderer = request.accepted_renderer
+    response.accepted_media_type = request.accepted_media_type
+    response.renderer_context = {"request": request, "response": response}
+    try:
+        return response.render()
+    except PDFRenderingQueueFullError as e:
+        response = HttpResponse(str(e), status=503, content_type="text/plain")
+        response["Retry-After"] = str(settings.PDF_QUEUE_TIMEOUT)
+        return response
+    except PDFRenderingTimeoutError as e:
+        return HttpResponse(str(e), status=504, content_type="text/plain")
+
+
+@api_view(["GET"])
+@renderer_classes([rest_framework.renderers.JSONRenderer])
+def metrics(request):
+    """
+    returns the counters of PDF rendering, the render and template cache.
+    """
+    return Response(
+        {
+            "pdf": pdf.metrics.as_dict(),
+            "render_cache": render_cache.info(),
+            "template_cache": template_cache.info(),
+        }
+    )
+
+
+def blob(request, blob_id: str):
+    """
+    returns a stored blob (e.g. an uploaded image); since the id is derived
+    from the content it may be cached forever.
+    """
+    path = blob_store.path_of(blob_id)
+    if path is None:
+        raise Http404(blob_id)
+    response = FileResponse(
+        path.open("rb"), content_type=blob_store.mime_type_of(blob_id)
+    )
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    response["ETag"] = '"{}"'.format(blob_id)
+    return response
+
+
 @api_view(["GET"])
 @renderer_classes(
     [rest_framework.renderers.JSONRenderer, MarkDownTableRenderer]
@@ -74,6 +74,8 @@ setup(
         'coreapi==2.*,>=2.3.3',
         'django==2.2.2',
         'djangorestframework==3.9.0',
+        'pillow>=8.2.0',
+        'pypdf==3.*,>=3.9.0',
         'pyyaml==5.*,>=5.3.1',
         'rope<0.19,>=0.17',
         'uritemplate==3.*,>=3.0.1',
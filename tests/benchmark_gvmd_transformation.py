@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# tests/benchmark_gvmd_transformation.py
+# Copyright (C) 2020-2021 Greenbone Networks GmbH
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Measures the throughput of pheme.transformation.scanreport.gvmd.transform in
+results per second.
+
+Usage:
+    python -m tests.benchmark_gvmd_transformation [amount_of_results ...]
+
+Without arguments reports with 10k, 100k and 1M results are measured.
+"""
+
+import logging
+import sys
+import time
+from typing import Dict, List
+
+from tests.generate_test_data import gen_host, gen_result
+
+
+def gen_benchmark_report(
+    amount: int, hosts: int = 1000, oids: int = 500
+) -> Dict:
+    """
+    generates a gvmd report with amount of results.
+
+    To keep the generation time low a pool of results gets generated upfront
+    and reused for each host; the host and port of each result are unique.
+    """
+    g_hosts = [gen_host("host_{}".format(i)) for i in range(hosts)]
+    pool = [
+        gen_result(g_hosts[0], "oid_{}".format(i % 100)) for i in range(oids)
+    ]
+    results: List[Dict] = []
+    for i in range(amount):
+        template = pool[i % oids]
+        results.append(
+            {
+                **template,
+                "host": g_hosts[i % hosts],
+                "port": "{}/tcp".format(i % 1024),
+            }
+        )
+    return {
+        "report": {
+            "report": {
+                "id": "benchmark",
+                "results": {"result": results},
+                "host": [
+                    {
+                        "ip": host["text"],
+                        "detail": [
+                            {"name": "best_os_txt", "value": "rusty rust"}
+                        ],
+                    }
+                    for host in g_hosts
+                ],
+            }
+        }
+    }
+
+
+def measure(amount: int, **kwargs) -> float:
+    """
+    returns the results per second of transform for a report with amount of
+    results.
+    """
+    # pylint: disable=C0415
+    from pheme.transformation.scanreport.gvmd import transform
+
+    data = gen_benchmark_report(amount)
+    start = time.perf_counter()
+    transform(data, **kwargs)
+    return amount / (time.perf_counter() - start)
+
+
+def main(amounts: List[int]):
+    # pylint: disable=C0415
+    import django
+
+    django.setup()
+    logging.disable(logging.INFO)
+    for amount in amounts:
+        print(
+            "{:>9} results: {:>12.0f} results/s".format(amount, measure(amount))
+        )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
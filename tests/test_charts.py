@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021 Greenbone Networks GmbH
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import caches
+
+from pheme.templatetags import charts
+from pheme.templatetags.charts import treemap as treemap_module
+from pheme.templatetags.charts.h_bar import h_bar_chart
+from pheme.templatetags.charts.pie import pie_chart
+from pheme.templatetags.charts.treemap import treemap
+
+data = {
+    "host_1": {"High": 3, "Medium": 1, "Low": 0},
+    "host_2": {"High": 0, "Medium": 4, "Low": 2},
+}
+
+
+def test_treemap_is_computed_once():
+    caches["charts"].clear()
+    transform = getattr(treemap_module, "__transform_to_tree_data")
+    with patch.object(
+        treemap_module, "__transform_to_tree_data", side_effect=transform
+    ) as mocked:
+        first = treemap(data)
+        assert treemap(data) == first
+        assert mocked.call_count == 1
+        treemap(data, 800)
+        assert mocked.call_count == 2
+
+
+def test_charts_of_different_parameter_differ():
+    caches["charts"].clear()
+    assert h_bar_chart(data) != h_bar_chart(data, "hosts")
+    assert pie_chart(data["host_1"]) != pie_chart(data["host_2"])
+    assert pie_chart(data["host_1"]) == pie_chart(data["host_1"])
+
+
+def test_not_serializable_data_is_not_cached():
+    chart_key = getattr(charts, "__chart_key")
+    assert chart_key("pie_chart", (data,), {}) is not None
+    assert chart_key("pie_chart", ({"High": object()},), {}) is None
+
+
+def test_squarify_many_sizes_without_recursion():
+    squarify = getattr(treemap_module, "__squarify")
+    sizes = sorted(range(1, 10001), reverse=True)
+    rects = squarify(sizes, treemap_module.Rect(0, 0, 800, 600))
+    assert len(rects) == len(sizes)
+    assert all(0 <= r.x <= 800 and 0 <= r.y <= 600 for r in rects)
+
+
+def test_squarify_small_rectangles_with_padding():
+    squarify = getattr(treemap_module, "__squarify")
+    rects = squarify([8, 4, 3, 3, 3], treemap_module.Rect(0, 0, 10, 10))
+    # the second rectangle of the first row is too small to be padded
+    coordinates = [value for r in rects for value in (r.x, r.y, r.dx, r.dy)]
+    assert coordinates == pytest.approx(
+        [1, 1, 26 / 7, 14 / 3]
+        + [1, 23 / 3, 26 / 7, 4 / 3]
+        + [47 / 7, 1, 16 / 7, 4 / 3]
+        + [47 / 7, 13 / 3, 16 / 7, 4 / 3]
+        + [47 / 7, 23 / 3, 16 / 7, 4 / 3]
+    )
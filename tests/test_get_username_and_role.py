@@ -15,8 +15,12 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
-from unittest.mock import patch
-from pheme.authentication import get_username_role
+from unittest.mock import Mock, patch
+from pheme.authentication import (
+    UserRoleCache,
+    get_username_role,
+    user_role_cache,
+)
 
 GSAD_FAKE_RESPONSE = """
 <envelope>
@@ -125,3 +129,64 @@ def test_not_call_on_missing_token_gsadsid(request):
     username, role = get_username_role(request, get=fake_get)
     assert username is None
     assert role is None
+
+
+def __counting_get(text: str):
+    calls = []
+
+    def fake_get(url, params, **kwargs):
+        calls.append(kwargs)
+        return Mock(text=text)
+
+    return fake_get, calls
+
+
+def __request(token: str, gsad_sid: str = "GSAD_SID"):
+    return Mock(
+        query_params=dict(token=token), COOKIES=dict(GSAD_SID=gsad_sid), META={}
+    )
+
+
+def test_user_role_is_cached():
+    user_role_cache.clear()
+    fake_get, calls = __counting_get(GSAD_FAKE_RESPONSE)
+    for _ in range(3):
+        assert get_username_role(__request("TOKEN"), get=fake_get) == (
+            "admin",
+            "Admin",
+        )
+    assert len(calls) == 1
+    assert calls[0]["timeout"]
+    get_username_role(__request("TOKEN", "OTHER_SID"), get=fake_get)
+    assert len(calls) == 2
+
+
+def test_unknown_user_is_cached():
+    user_role_cache.clear()
+    fake_get, calls = __counting_get("<envelope></envelope>")
+    for _ in range(2):
+        assert get_username_role(__request("INVALID"), get=fake_get) == (
+            None,
+            None,
+        )
+    assert len(calls) == 1
+
+
+def test_user_role_is_resolved_once_per_request():
+    user_role_cache.clear()
+    fake_get, calls = __counting_get(GSAD_FAKE_RESPONSE)
+    request = __request("TOKEN")
+    get_username_role(request, get=fake_get)
+    user_role_cache.clear()
+    assert get_username_role(request, get=fake_get) == ("admin", "Admin")
+    assert len(calls) == 1
+
+
+def test_least_recently_used_user_role_is_removed():
+    cache = UserRoleCache(ttl=60, negative_ttl=5, maxsize=2)
+    cache.set(("a",), ("a", "User"))
+    cache.set(("b",), ("b", "User"))
+    cache.get(("a",))
+    cache.set(("c",), ("c", "User"))
+    assert cache.get(("a",)) == ("a", "User")
+    assert cache.get(("b",)) is None
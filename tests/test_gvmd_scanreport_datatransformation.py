@@ -21,6 +21,7 @@ import pytest
 from pheme.transformation.scanreport.gvmd import (
     transform,
 )
+from pheme.transformation.scanreport.model import resolve, serialize
 
 from tests.generate_test_data import gen_report
 
@@ -32,23 +33,23 @@ def test_should_contain_non_general_ports():
     scan_results = gen_report(hosts, oids, port="80/tcp")
     data = {"report": {"report": scan_results}}
     report = transform(data)
-    assert report.results[0]["equipment"]["ports"] == {"80/tcp"}
+    assert report.results[0].equipment.ports == {"80/tcp"}
 
 
 def test_remove_general_from_equipment_port_list():
     scan_results = gen_report(hosts, oids, port="general/tcp")
     data = {"report": {"report": scan_results}}
     report = transform(data)
-    assert report.results[0]["equipment"]["ports"] == []
+    assert report.results[0].equipment.ports == []
 
 
 def test_grouping_nvt_oid_per_type():
     scan_results = gen_report(hosts, oids, with_optional=True)
     data = {"report": {"report": scan_results}}
     report = transform(data)
-    results = report.results[0]["results"]
+    results = report.results[0].results
     # so far refs are hardcoded to ten
-    assert len(results[0]["nvt_refs_ref"]["CVE"]) == 10
+    assert len(results[0].nvt["nvt_refs_ref"]["CVE"]) == 10
 
 
 @pytest.mark.parametrize(
@@ -65,3 +66,62 @@ def test_report_generation_per_host(expected):
     data = {"report": {"report": scan_results}}
     report = transform(data)
     assert len(report.results or []) == amount_scans
+
+
+def test_host_summaries_match_results():
+    scan_results = gen_report(hosts, oids, with_optional=True)
+    data = {"report": {"report": scan_results}}
+    report = transform(data)
+    for host in report.results:
+        results = host.results
+        assert host.threats["total"] == len(results)
+        assert host.severities["total"] == len(results)
+        assert host.equipment.ports == {r.port for r in results}
+        assert report.overview.hosts[host.host] == {
+            threat: len([r for r in results if r.threat == threat])
+            for threat in ["High", "Medium", "Low"]
+        }
+
+
+def test_serialize_contains_flat_results():
+    scan_results = gen_report(hosts, oids, with_optional=True)
+    data = {"report": {"report": scan_results}}
+    report = transform(data)
+    serialized = serialize(report)
+    host = serialized["results"][0]
+    assert host["host"] == report.results[0].host
+    assert host["equipment"]["ports"] == report.results[0].equipment.ports
+    result = host["results"][0]
+    assert result["nvt_oid"] in oids
+    assert "nvt_refs_ref" not in result
+    assert serialized["nvts"][result["nvt_oid"]]["nvt_refs_ref"]["CVE"]
+    assert result["qod_value"] == report.results[0].results[0].qod_value
+
+
+def test_nvt_catalogue_is_shared_between_results():
+    scan_results = gen_report(hosts, oids, with_optional=True)
+    data = {"report": {"report": scan_results}}
+    report = transform(data)
+    results = [result for host in report.results for result in host.results]
+    assert set(report.nvts.keys()) == {r.nvt["nvt_oid"] for r in results}
+    for result in results:
+        assert result.nvt is report.nvts[result.nvt["nvt_oid"]]
+
+
+def test_resolve_nvt_catalogue():
+    scan_results = gen_report(hosts, oids, with_optional=True)
+    data = {"report": {"report": scan_results}}
+    report = transform(data)
+    resolved = resolve(serialize(report))
+    assert "nvts" not in resolved
+    for host, expected in zip(resolved["results"], report.results):
+        for result, expected_result in zip(host["results"], expected.results):
+            assert result == {
+                "port": expected_result.port,
+                "threat": expected_result.threat,
+                "severity": expected_result.severity,
+                "description": expected_result.description,
+                **expected_result.nvt,
+                "qod_value": expected_result.qod_value,
+                "qod_type": expected_result.qod_type,
+            }
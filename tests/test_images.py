@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021 Greenbone Networks GmbH
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import io
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+from pheme import blob_store, images
+
+
+def __png(size) -> bytes:
+    output = io.BytesIO()
+    Image.radial_gradient("L").resize(size).convert("RGBA").save(output, "PNG")
+    return output.getvalue()
+
+
+@patch("pheme.images.settings.IMAGE_MAX_SIZE", 100)
+def test_large_image_is_downscaled():
+    data, mime_type = images.normalize(__png((400, 200)), "image/png")
+    assert mime_type == "image/png"
+    assert Image.open(io.BytesIO(data)).size == (100, 50)
+
+
+@patch("pheme.images.settings.IMAGE_MAX_SIZE", 100)
+def test_small_image_is_kept_when_not_smaller():
+    small = __png((10, 10))
+    assert images.normalize(small, "image/png") == (small, "image/png")
+
+
+def test_svg_is_kept():
+    svg = b"<svg></svg>"
+    assert images.normalize(svg, "image/svg+xml") == (svg, "image/svg+xml")
+
+
+def test_broken_image_is_refused():
+    with pytest.raises(ValueError):
+        images.normalize(b"no png", "image/png")
+
+
+@patch("pheme.images.settings.IMAGE_MAX_SIZE", 100)
+def test_same_upload_is_normalized_once(tmp_path):
+    upload = __png((400, 200))
+    with patch("pheme.blob_store.settings.BLOB_STORE_PATH", str(tmp_path)):
+        with patch(
+            "pheme.blob_store.images.normalize", wraps=images.normalize
+        ) as normalize:
+            reference = blob_store.put_image(upload, "image/png")
+            assert blob_store.put_image(upload, "image/png") == reference
+            assert normalize.call_count == 1
+    assert len(list(tmp_path.glob("*.png"))) == 1
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021 Greenbone Networks GmbH
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from concurrent.futures import ThreadPoolExecutor
+
+from pheme import jobs
+
+
+def run(func, *args):
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        job_id = jobs.submit("test", func, *args, executor=executor)
+    return jobs.state(job_id)
+
+
+def test_job_done():
+    def job(progress, value):
+        progress(50)
+        assert jobs.state(progress.job_id)["progress"] == 50
+        return value
+
+    state = run(job, "result-name")
+    assert state["status"] == "done"
+    assert state["progress"] == 100
+    assert state["name"] == "result-name"
+
+
+def test_job_failed():
+    def job(progress):
+        raise ValueError("broken report")
+
+    state = run(job)
+    assert state["status"] == "failed"
+    assert state["error"] == "broken report"
+    assert state["name"] is None
+
+
+def test_unknown_job():
+    assert jobs.state("test-job-unknown") is None
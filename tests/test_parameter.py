@@ -15,11 +15,18 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from unittest.mock import patch
 import pytest
 from rest_framework.test import APIClient
 from rest_framework.reverse import reverse
-from pheme.settings import SECRET_KEY
+from django.core.files.uploadedfile import SimpleUploadedFile
+from pheme import blob_store
+from pheme.parameter import load_params
+from pheme.parameter_store import ParameterStore
+from pheme.settings import PARAMETER_FILE_ADDRESS, SECRET_KEY
 
 
 @patch("pheme.parameter.pheme.authentication.get_username_role")
@@ -133,3 +140,86 @@ def test_put_main_color():
         url, data="#66c430", format="json", HTTP_X_API_KEY=SECRET_KEY
     )
     assert response.status_code == 200
+
+
+def test_load_params_reads_files_once(tmp_path):
+    system = tmp_path / "parameter.json"
+    system.write_text('{"main_color": "#000"}')
+    default = tmp_path / "default.json"
+    with patch("pheme.parameter.Path.read_text") as read_text:
+        read_text.return_value = '{"main_color": "#000"}'
+        for _ in range(3):
+            params = load_params(str(system), str(default))
+        assert read_text.call_count == 1
+    assert params == {"main_color": "#000"}
+
+
+def test_put_invalidates_cached_params():
+    load_params()
+    client = APIClient()
+    url = reverse(
+        "put_value_parameters",
+        kwargs={"key": "cached_color"},
+    )
+    for color in ["#000", "#fff"]:
+        response = client.put(
+            url, data=color, format="json", HTTP_X_API_KEY=SECRET_KEY
+        )
+        assert response.status_code == 200
+        assert load_params()["cached_color"] == color
+
+
+def test_put_just_writes_the_changed_parameter():
+    system = Path(PARAMETER_FILE_ADDRESS)
+    before = system.stat().st_mtime_ns if system.exists() else None
+    client = APIClient()
+    url = reverse(
+        "put_value_parameters",
+        kwargs={"key": "single_color"},
+    )
+    response = client.put(
+        url, data="#123", format="json", HTTP_X_API_KEY=SECRET_KEY
+    )
+    assert response.status_code == 200
+    assert response.data["single_color"] == "#123"
+    stored = system.with_suffix(".d").joinpath("single_color.json")
+    assert json.loads(stored.read_text()) == "#123"
+    assert (system.stat().st_mtime_ns if system.exists() else None) == before
+    assert load_params()["single_color"] == "#123"
+
+
+def test_concurrent_user_updates_are_not_lost(tmp_path):
+    store = ParameterStore(tmp_path / "parameter.d")
+
+    def put(i: int):
+        store.put_user("admin", {"key_{}".format(i): i})
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(put, range(32)))
+    users = store.load()["user_specific"]
+    assert users["admin"] == {"key_{}".format(i): i for i in range(32)}
+    assert store.generation() == 32
+
+
+def test_put_image_stores_a_blob(tmp_path):
+    client = APIClient()
+    image = SimpleUploadedFile(
+        "logo.svg", b"<svg></svg>", content_type="image/svg+xml"
+    )
+    with patch("pheme.blob_store.settings.BLOB_STORE_PATH", str(tmp_path)):
+        response = client.put(
+            reverse("put_parameter"),
+            data={"logo": image},
+            HTTP_X_API_KEY=SECRET_KEY,
+        )
+        assert response.status_code == 200
+        blob_id = blob_store.blob_id_of(response.data["logo"])
+        assert blob_id is not None
+        response = client.get(reverse("blob", kwargs={"blob_id": blob_id}))
+        assert response.status_code == 200
+        assert b"".join(response.streaming_content) == b"<svg></svg>"
+        assert "immutable" in response["Cache-Control"]
+        response = client.get(
+            reverse("blob", kwargs={"blob_id": "0" * 32 + ".png"})
+        )
+        assert response.status_code == 404
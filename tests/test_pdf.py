@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021 Greenbone Networks GmbH
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import io
+from unittest.mock import patch
+
+import pypdf
+import pytest
+
+from pheme import blob_store
+from pheme.errors import PDFRenderingError, PDFRenderingTimeoutError
+from pheme.transformation.scanreport import pdf
+
+html = "<html><body><h1>pheme</h1></body></html>"
+css = "h1 { color: #66c430; }"
+
+
+def test_write_pdf_within_thread():
+    renders = pdf.metrics.renders
+    assert pdf.write_pdf(html, css).startswith(b"%PDF")
+    assert pdf.write_pdf(html, css).startswith(b"%PDF")
+    assert pdf.metrics.renders == renders + 2
+
+
+@patch("pheme.transformation.scanreport.pdf.settings.PDF_WORKERS", 1)
+def test_write_pdf_within_pool():
+    renders = pdf.metrics.renders
+    assert pdf.write_pdf(html, css).startswith(b"%PDF")
+    assert pdf.metrics.renders == renders + 1
+    assert pdf.metrics.as_dict()["render_seconds"] > 0
+
+
+@patch("pheme.transformation.scanreport.pdf.settings.PDF_WORKERS", 1)
+@patch("pheme.transformation.scanreport.pdf.settings.PDF_TIMEOUT", 0)
+def test_write_pdf_timeout():
+    timeouts = pdf.metrics.timeouts
+    with pytest.raises(PDFRenderingTimeoutError):
+        pdf.write_pdf(html * 100, css)
+    assert pdf.metrics.timeouts == timeouts + 1
+
+
+def test_stylesheet_is_parsed_once():
+    renderer = pdf._Renderer()  # pylint: disable=protected-access
+    assert renderer.stylesheet(css) is renderer.stylesheet(css)
+
+
+def test_write_pdf_in_chunks():
+    assert pdf.write_pdf(iter([html, html, html]), css).startswith(b"%PDF")
+
+
+@patch("pheme.transformation.scanreport.pdf.settings.PDF_WORKERS", 1)
+def test_write_pdf_in_chunks_within_pool():
+    assert pdf.write_pdf(iter([html, html]), css).startswith(b"%PDF")
+
+
+def test_chunk_is_written_before_the_next_one_is_created():
+    events = []
+
+    def chunks():
+        for _ in range(2):
+            events.append("chunk")
+            yield html
+
+    def merge(chunks):
+        for _ in chunks:
+            events.append("pdf")
+        return b"%PDF"
+
+    with patch("pheme.transformation.scanreport.pdf._merge", merge):
+        assert pdf.write_pdf(chunks(), css) == b"%PDF"
+    assert events == ["chunk", "pdf", "chunk", "pdf"]
+
+
+def test_chunks_are_merged_into_one_pdf():
+    merged = pdf.write_pdf(iter([html, html]), css)
+    assert len(pypdf.PdfReader(io.BytesIO(merged)).pages) == 2
+
+
+def test_chunks_share_one_outline():
+    chunks = iter(
+        [
+            "<html><body><h1>results</h1><h2>a</h2></body></html>",
+            "<html><body><h2>b</h2></body></html>",
+        ]
+    )
+    reader = pypdf.PdfReader(io.BytesIO(pdf.write_pdf(chunks, css)))
+    results, hosts = reader.outline
+    assert results.title == "results"
+    assert [host.title for host in hosts] == ["a", "b"]
+    pages = [reader.get_destination_page_number(host) for host in hosts]
+    assert pages == [0, 1]
+
+
+@patch("pheme.transformation.scanreport.pdf.pypdf", None)
+def test_write_pdf_in_chunks_without_pypdf():
+    with pytest.raises(PDFRenderingError, match="requires pypdf"):
+        pdf.write_pdf(iter([html, html]), css)
+
+
+def test_assets_are_served_from_memory():
+    url, asset = pdf.svg_asset("<svg></svg>")
+    fetch = pdf._url_fetcher({url: asset})  # pylint: disable=protected-access
+    assert fetch(url)["string"] == b"<svg></svg>"
+    assert fetch(url)["mime_type"] == "image/svg+xml"
+
+
+def test_blobs_are_served_from_the_blob_store(tmp_path):
+    with patch("pheme.blob_store.settings.BLOB_STORE_PATH", str(tmp_path)):
+        url = blob_store.put(b"<svg></svg>", "image/svg+xml")
+        fetch = pdf._url_fetcher({})  # pylint: disable=protected-access
+        assert fetch(url)["string"] == b"<svg></svg>"
+        assert fetch(url)["mime_type"] == "image/svg+xml"
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021 Greenbone Networks GmbH
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from pheme import jobs, settings
+from pheme.render_cache import GENERATION_KEY, render_cache
+from pheme.settings import SECRET_KEY
+from pheme.transformation.scanreport.renderer import VulnerabilityHTMLReport
+from tests.generate_test_data import gen_report
+
+
+def __transform() -> str:
+    report = {"report": {"report": gen_report(["host_0"], ["oid_1"])}}
+    response = APIClient().post(reverse("transform"), data=report, format="xml")
+    assert response.status_code == 200
+    return response.data
+
+
+def __put_template(template: str):
+    response = APIClient().put(
+        reverse("put_parameter"),
+        data={
+            "vulnerability_report_html_css": "p {}",
+            "vulnerability_report_html_template": template,
+        },
+        HTTP_X_API_KEY=SECRET_KEY,
+    )
+    assert response.status_code == 200
+
+
+def __get(name: str, **kwargs):
+    response = APIClient().get(
+        reverse("report", kwargs={"name": name}),
+        HTTP_ACCEPT="text/html",
+        **kwargs,
+    )
+    assert response.status_code == 200
+    return response.getvalue().decode()
+
+
+@patch("pheme.transformation.scanreport.renderer.get_username_role")
+def test_rendered_report_is_cached(user_information):
+    user_information.return_value = (None, None)
+    __put_template("<p>{{ internal_name }}</p>")
+    name = __transform()
+    render_cache.clear()
+    with patch.object(
+        VulnerabilityHTMLReport,
+        "apply",
+        side_effect=VulnerabilityHTMLReport.apply,
+        autospec=True,
+    ) as apply:
+        assert __get(name) == __get(name) == "<p>{}</p>".format(name)
+        assert apply.call_count == 1
+    assert render_cache.info()["hits"] == 1
+    assert render_cache.info()["misses"] == 1
+
+
+@patch("pheme.transformation.scanreport.renderer.get_username_role")
+def test_token_of_a_session_is_not_part_of_the_key(user_information):
+    user_information.return_value = (None, None)
+    __put_template("<p>{{ internal_name }}</p>")
+    name = __transform()
+    with patch.object(
+        VulnerabilityHTMLReport,
+        "apply",
+        side_effect=VulnerabilityHTMLReport.apply,
+        autospec=True,
+    ) as apply:
+        __get(name, data={"token": "abc"})
+        __get(name, data={"token": "def"})
+        assert apply.call_count == 1
+        __get(name, data={"token": "def", "without_overview": "1"})
+        assert apply.call_count == 2
+
+
+@patch("pheme.transformation.scanreport.renderer.get_username_role")
+def test_parameter_write_invalidates_rendered_reports(user_information):
+    user_information.return_value = (None, None)
+    __put_template("<p>first</p>")
+    name = __transform()
+    generation = render_cache.generation()
+    assert __get(name) == "<p>first</p>"
+    __put_template("<p>second</p>")
+    assert render_cache.generation() == generation + 1
+    assert __get(name) == "<p>second</p>"
+
+
+def test_generation_does_not_expire():
+    render_cache.invalidate()
+    render_cache.invalidate()
+    generation = render_cache.generation()
+    expired = time.time() + settings.CACHES["default"]["TIMEOUT"] + 1
+    with patch("time.time", return_value=expired):
+        assert render_cache.generation() == generation
+
+
+def test_lost_generation_is_not_reused():
+    render_cache.invalidate()
+    generation = render_cache.generation()
+    cache.delete(GENERATION_KEY)
+    assert render_cache.generation() > generation
+
+
+def test_metrics_contain_render_cache():
+    response = APIClient().get(reverse("metrics"))
+    assert response.status_code == 200
+    assert response.data["render_cache"] == render_cache.info()
+
+
+@patch("pheme.parameter.pheme.authentication.get_username_role")
+@patch("pheme.transformation.scanreport.renderer.get_username_role")
+def test_user_specific_parameter_are_part_of_the_key(
+    user_information, parameter_user_information
+):
+    parameter_user_information.return_value = (None, None)
+    __put_template("<p>{{ color }}</p>")
+    parameter_user_information.return_value = ("test", "admin")
+    response = APIClient().put(
+        reverse("put_value_parameters", kwargs={"key": "color"}),
+        data="#000",
+        format="json",
+    )
+    assert response.status_code == 200
+    name = __transform()
+    user_information.return_value = ("test", "admin")
+    assert __get(name) == "<p>#000</p>"
+    user_information.return_value = ("other", "admin")
+    assert __get(name) == "<p></p>"
+
+
+@patch("pheme.transformation.scanreport.renderer.get_username_role")
+def test_report_is_pre_rendered_after_transformation(user_information):
+    user_information.return_value = (None, None)
+    __put_template("<p>{{ internal_name }}</p>")
+    with patch.object(settings, "PRE_RENDER", ["text/html"]):
+        with ThreadPoolExecutor(max_workers=1) as executor, patch(
+            "pheme.views.jobs.submit",
+            side_effect=partial(jobs.submit, executor=executor),
+        ):
+            name = __transform()
+    render_cache.clear()
+    with patch.object(VulnerabilityHTMLReport, "apply") as apply:
+        # gsad sends the token of its session within the query
+        assert __get(name, data={"token": "abc"}) == "<p>{}</p>".format(name)
+        apply.assert_not_called()
+    assert render_cache.info()["hits"] == 1
@@ -17,16 +17,23 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import csv
+import json
+import time
 from unittest.mock import patch
 from typing import List, Optional
 import pytest
-from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Template
 from django.urls import reverse
 from rest_framework.test import APIClient
 
+from pheme import blob_store
 from pheme.datalink import as_datalink
+from pheme.errors import PDFRenderingQueueFullError, PDFRenderingTimeoutError
 from pheme.settings import SECRET_KEY
 from pheme.transformation.scanreport import renderer
+from pheme.transformation.scanreport import store as report_store
 
 from tests.generate_test_data import gen_report
 
@@ -50,11 +57,25 @@ def test_report_contains_equipment():
     }
     response = client.post(url, data=report, format="xml")
     assert response.status_code == 200
-    result = cache.get(response.data)
+    result = report_store.load(response.data)
     assert result["results"][0]["equipment"]["os"] == "rusty rust rust"
     assert result["results"][0]["equipment"]["ports"] is not None
 
 
+def test_transformed_report_is_available_via_cache():
+    client = APIClient()
+    report = {
+        "report": {
+            "report": gen_report(generate("host", 10), generate("oid", 5))
+        }
+    }
+    name = client.post(reverse("transform"), data=report, format="xml").data
+    response = client.get(reverse("load_cache", args=[name]))
+    assert response.status_code == 200
+    assert response.json()["internal_name"] == name
+    assert len(response.json()["results"]) == 10
+
+
 def test_report_contains_charts():
     client = APIClient()
     url = reverse("transform")
@@ -65,13 +86,72 @@ def test_report_contains_charts():
     }
     response = client.post(url, data=report, format="xml")
     assert response.status_code == 200
-    result = cache.get(response.data)
+    result = report_store.load(response.data)
     assert result["overview"] is not None
     assert result["overview"]["hosts"] is not None
     assert result["overview"]["nvts"] is not None
     # assert result['overview']['vulnerable_equipment'] is not None
 
 
+def test_async_transform():
+    client = APIClient()
+    url = reverse("transform")
+    report = {
+        "report": {
+            "report": gen_report(generate("host", 10), generate("oid", 5))
+        }
+    }
+    response = client.post(url + "?async=1", data=report, format="xml")
+    assert response.status_code == 202
+    job_url = reverse("transform_job", args=[response.data])
+    for _ in range(100):
+        state = client.get(job_url).data
+        if state["status"] not in ("queued", "running"):
+            break
+        time.sleep(0.1)
+    assert state["status"] == "done"
+    assert state["progress"] == 100
+    result = report_store.load(state["name"])
+    assert result["results"][0]["equipment"]["os"] == "rusty rust rust"
+
+
+def test_transform_is_synchronous_on_async_0():
+    client = APIClient()
+    url = reverse("transform")
+    report = {
+        "report": {
+            "report": gen_report(generate("host", 10), generate("oid", 5))
+        }
+    }
+    response = client.post(url + "?async=0", data=report, format="xml")
+    assert response.status_code == 200
+    assert report_store.load(response.data) is not None
+
+
+def test_unknown_transform_job():
+    client = APIClient()
+    url = reverse("transform_job", args=["transform-job-unknown"])
+    assert client.get(url).status_code == 404
+
+
+def test_render_pdf_chunks():
+    template = Template(
+        "{% if chunk.first %}cover;{% endif %}"
+        "{% for host in results %}{{ host.host }};{% endfor %}"
+    )
+    data = {"results": [{"host": "host_{}".format(i)} for i in range(5)]}
+    chunks = list(
+        renderer._render_chunks(  # pylint: disable=protected-access
+            template, "report", data, {}, 2, {}
+        )
+    )
+    assert chunks == [
+        "cover;host_0;host_1;",
+        "host_2;host_3;",
+        "host_4;",
+    ]
+
+
 @pytest.mark.parametrize(
     "html_contains",
     [
@@ -83,8 +163,28 @@ def test_report_contains_charts():
 def test_workaround_for_inline_svg_and_weasyprint(html_contains):
     # pylint: disable=W0212
     html, contains = html_contains
-    result = renderer._replace_inline_svg_with_img_tags(html)
+    assets = {}
+    result = renderer._extract_svg_assets(html, assets)
     assert contains in result
+    assert bool(assets) == (contains == "img")
+
+
+def test_same_svg_results_in_one_asset():
+    # pylint: disable=W0212
+    svg = '<svg width="343"><g id="severity_arrows"></svg>'
+    assets = {}
+    result = renderer._extract_svg_assets(
+        "<div>{0}</div><div>{0}</div>".format(svg), assets
+    )
+    assert len(assets) == 1
+    url = list(assets.keys())[0]
+    assert (
+        result
+        == '<div><img src="{0}" /></div><div><img src="{0}" /></div>'.format(
+            url
+        )
+    )
+    assert assets[url]["string"] == svg.encode()
 
 
 def test_dynamic_template():
@@ -234,6 +334,113 @@ def test_http_accept(
     return html_report
 
 
+@pytest.mark.parametrize(
+    "error, status_code",
+    [
+        (PDFRenderingQueueFullError("PDF rendering queue is full"), 503),
+        (PDFRenderingTimeoutError("PDF rendering took longer than 1s"), 504),
+    ],
+)
+def test_pdf_rendering_errors_are_mapped_to_status_codes(error, status_code):
+    client = APIClient()
+    report = gen_report(generate("host", 1), generate("oid", 1))
+    response = client.post(
+        reverse("transform"), data={"report": {"report": report}}, format="xml"
+    )
+    report_url = reverse("report", kwargs={"name": response.data})
+    with patch(
+        "pheme.transformation.scanreport.renderer.write_pdf",
+        side_effect=error,
+    ):
+        response = client.get(report_url, HTTP_ACCEPT="application/pdf")
+    assert response.status_code == status_code
+    assert response.content.decode() == str(error)
+
+
+def test_metrics():
+    response = APIClient().get(reverse("metrics"))
+    assert response.status_code == 200
+    assert "renders" in response.data["pdf"]
+
+
+@pytest.mark.parametrize(
+    "base_url, expected",
+    [
+        (None, as_datalink(b"<svg></svg>", "image/svg+xml")),
+        ("https://gsa.example/pheme/", "https://gsa.example/pheme/blob/{}"),
+    ],
+)
+def test_html_report_contains_uploaded_image(tmp_path, base_url, expected):
+    client = APIClient()
+    logo = SimpleUploadedFile(
+        "logo.svg", b"<svg></svg>", content_type="image/svg+xml"
+    )
+    with patch("pheme.blob_store.settings.BLOB_STORE_PATH", str(tmp_path)):
+        response = client.put(
+            reverse("put_parameter"),
+            data={
+                "vulnerability_report_html_css": "img { width: 1px; }",
+                "vulnerability_report_html_template": '<img src="{{ logo }}">',
+                "logo": logo,
+            },
+            HTTP_X_API_KEY=SECRET_KEY,
+        )
+        assert response.status_code == 200
+        blob_id = blob_store.blob_id_of(response.data["logo"])
+        with patch(
+            "pheme.transformation.scanreport.renderer.settings.BLOB_BASE_URL",
+            base_url,
+        ):
+            response = test_http_accept("text/html")
+    html_report = response.getvalue().decode("utf-8")
+    assert html_report == '<img src="{}">'.format(expected.format(blob_id))
+
+
+def __export(http_accept: str):
+    client = APIClient()
+    report = gen_report(generate("host", 3), generate("oid", 2))
+    response = client.post(
+        reverse("transform"), data={"report": {"report": report}}, format="xml"
+    )
+    assert response.status_code == 200
+    key = response.data
+    amount = sum(len(h["results"]) for h in report_store.load(key)["results"])
+    response = client.get(
+        reverse("report", kwargs={"name": key}), HTTP_ACCEPT=http_accept
+    )
+    assert response.status_code == 200
+    assert response.streaming
+    lines = b"".join(response.streaming_content).decode().splitlines()
+    return amount, lines
+
+
+def test_csv_export_is_streamed():
+    amount, lines = __export("text/csv")
+    header = lines[0].split(",")
+    assert header[:5] == ["id", "name", "comment", "start", "overview"]
+    assert "nvt_oid" in header and "qod_type" in header
+    # one row per result
+    assert len(lines) == 1 + amount
+    rows = list(csv.DictReader(lines))
+    assert all(row["os"] == "rusty rust rust" for row in rows)
+
+
+def test_ndjson_export_contains_a_line_per_result():
+    amount, lines = __export("application/x-ndjson")
+    assert len(lines) == amount
+    results = [json.loads(line) for line in lines]
+    assert all(result["host"] and result["nvt_oid"] for result in results)
+
+
+def test_xml_export_is_streamed():
+    amount, lines = __export("application/xml")
+    assert lines[0] == '<?xml version="1.0" encoding="utf-8"?>'
+    document = "\n".join(lines[1:])
+    assert document.startswith("<report><id>")
+    assert document.endswith("</report>")
+    assert document.count("<qod_type>") == amount
+
+
 def test_generate_format_editor_html_report():
     def upload(key, data):
         cache_url = reverse("store_cache")
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021 Greenbone Networks GmbH
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import csv
+import pickle
+import struct
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+
+from pheme.renderer import stream_csv
+from pheme.storage import store
+from pheme.transformation.scanreport import store as report_store
+from pheme.transformation.scanreport.gvmd import transform
+from pheme.transformation.scanreport.model import resolve, serialize
+
+from tests.generate_test_data import gen_report
+
+hosts = ["host_{}".format(i) for i in range(10)]
+oids = ["oid_{}".format(i) for i in range(5)]
+
+
+@pytest.fixture(name="serialized")
+def fixture_serialized(tmp_path):
+    with patch("pheme.settings.REPORT_STORE_PATH", str(tmp_path)):
+        yield serialize(
+            transform({"report": {"report": gen_report(hosts, oids)}})
+        )
+
+
+def test_load_equals_resolved_report(serialized):
+    name = store("scanreport", serialized, handler=report_store.store_handler)
+    loaded = report_store.load(name)
+    assert isinstance(loaded["results"], report_store.HostSequence)
+    assert report_store.materialize(loaded) == resolve(serialized)
+
+
+def test_hosts_are_loaded_lazily(serialized):
+    name = store("scanreport", serialized, handler=report_store.store_handler)
+    loaded = report_store.load(name)
+    with patch(
+        "pheme.transformation.scanreport.store.resolve_result"
+    ) as resolve_result:
+        resolve_result.side_effect = lambda result, _: result
+        hosts_loaded = loaded["results"][:2]
+    assert len(hosts_loaded) == 2
+    assert resolve_result.call_count == sum(
+        len(host["results"]) for host in serialized["results"][:2]
+    )
+    assert loaded["results"][0] is hosts_loaded[0]
+
+
+def test_csv_export_contains_nvts_without_oid(serialized):
+    serialized["results"][0]["results"].append(
+        {
+            "port": "1/tcp",
+            "nvt_name": "without oid",
+            "nvt_uncatalogued": "x",
+            "nvt_tags_interpreted": {"uncatalogued_tag": "y"},
+        }
+    )
+    name = store("scanreport", serialized, handler=report_store.store_handler)
+    loaded = report_store.load(name)
+    rows = list(
+        csv.DictReader(
+            stream_csv(
+                loaded, report_store.hosts(loaded), report_store.nvts(loaded)
+            )
+        )
+    )
+    row = next(row for row in rows if row["nvt_name"] == "without oid")
+    assert row["nvt_uncatalogued"] == "x"
+    assert row["uncatalogued_tag"] == "y"
+
+
+def test_load_report_written_without_uncatalogued_nvts(serialized, tmp_path):
+    name = store("scanreport", serialized, handler=report_store.store_handler)
+    meta = {
+        k: v for k, v in serialized.items() if k not in ("results", "nvts")
+    }
+    sections = [meta, serialized["nvts"], *serialized["results"]]
+    magic = report_store.MAGIC_WITHOUT_UNCATALOGUED_NVTS
+    with tmp_path.joinpath("{}.report".format(name)).open("wb") as f:
+        f.write(magic)
+        index = []
+        for section in sections:
+            data = pickle.dumps(section)
+            index.append((f.tell(), len(data)))
+            f.write(data)
+        index_offset = f.tell()
+        index_data = pickle.dumps(index)
+        f.write(index_data)
+        f.write(struct.pack("<QQ8s", index_offset, len(index_data), magic))
+    report_store.report_cache.clear()
+    loaded = report_store.load(name)
+    assert isinstance(loaded["results"], report_store.HostSequence)
+    assert report_store.materialize(loaded) == resolve(serialized)
+
+
+def test_fallback_to_cache(serialized):
+    name = store("scanreport", serialized)
+    assert report_store.load(name) == resolve(cache.get(name))
+
+
+def test_removed_report_of_the_cache_is_not_loaded(serialized):
+    name = store("scanreport", serialized)
+    assert report_store.load(name)
+    cache.delete(name)
+    assert report_store.load(name) is None
+
+
+def test_expired_report_is_removed(serialized):
+    name = store("scanreport", serialized, handler=report_store.store_handler)
+    with patch("pheme.settings.REPORT_STORE_TIMEOUT", -1):
+        assert report_store.load(name) is None
+        store("scanreport", serialized, handler=report_store.store_handler)
+    with patch("pheme.settings.REPORT_STORE_TIMEOUT", None):
+        assert report_store.load(name) is None
+
+
+def test_repeated_load_uses_loaded_report(serialized):
+    name = store("scanreport", serialized, handler=report_store.store_handler)
+    first = report_store.load(name)
+    first_host = first["results"][0]
+    with patch(
+        "pheme.transformation.scanreport.store.load_handler"
+    ) as load_handler:
+        second = report_store.load(name)
+    load_handler.assert_not_called()
+    assert second["results"][0] == first_host
+    assert second["results"][0] is not first_host
+
+
+def test_changes_of_a_loaded_report_are_not_shared(serialized):
+    name = store("scanreport", serialized, handler=report_store.store_handler)
+    first = report_store.load(name)
+    first.pop("overview")
+    first["results"][0]["results"] = []
+    second = report_store.materialize(report_store.load(name))
+    assert second == resolve(serialized)
+
+
+def test_loaded_hosts_are_not_kept_within_the_cache(serialized):
+    name = store("scanreport", serialized, handler=report_store.store_handler)
+    report_store.materialize(report_store.load(name))
+    nbytes = report_store.report_cache.info()["nbytes"]
+    with patch(
+        "pheme.transformation.scanreport.store.resolve_result"
+    ) as resolve_result:
+        resolve_result.side_effect = lambda result, _: result
+        assert report_store.load(name)["results"][0]
+    assert resolve_result.call_count == len(serialized["results"][0]["results"])
+    assert report_store.report_cache.info()["nbytes"] == nbytes
+
+
+def test_report_cache_is_bounded(serialized):
+    report_cache = report_store.ReportCache(maxsize=2)
+    for name in ("a", "b", "c"):
+        report_cache.put(name, {"results": [], "name": name})
+    assert report_cache.get("a") is None
+    assert report_cache.get("c")["name"] == "c"
+    report_cache = report_store.ReportCache(maxbytes=0)
+    report_cache.put("a", serialized)
+    assert report_cache.info()["size"] == 0
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021 Greenbone Networks GmbH
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import pytest
+from django.utils.safestring import SafeString
+
+from pheme.storage import COMPRESSION, SERIALIZER, CodecFileBasedCache
+
+from tests.generate_test_data import gen_report
+
+report = gen_report(["host_1", "host_2"], ["oid_1", "oid_2"])
+
+
+def cache_with(tmp_path, **options) -> CodecFileBasedCache:
+    return CodecFileBasedCache(str(tmp_path), {"OPTIONS": options})
+
+
+@pytest.mark.parametrize("serializer", SERIALIZER.keys())
+@pytest.mark.parametrize("compression", COMPRESSION.keys())
+def test_store_and_load(tmp_path, serializer, compression):
+    cache = cache_with(tmp_path, SERIALIZER=serializer, COMPRESSION=compression)
+    cache.set("report", report)
+    assert cache.get("report") == report
+    assert cache.touch("report")
+    assert cache.get("report") == report
+
+
+def test_changed_codec_is_a_miss(tmp_path):
+    cache_with(tmp_path, SERIALIZER="marshal", COMPRESSION="lzma").set(
+        "report", report
+    )
+    cache = cache_with(tmp_path)
+    assert cache.get("report", "missing") == "missing"
+    assert not cache.has_key("report")
+
+
+@pytest.mark.parametrize("serializer", SERIALIZER.keys())
+def test_store_and_load_rendered_template(tmp_path, serializer):
+    cache = cache_with(tmp_path, SERIALIZER=serializer)
+    cache.set("html", SafeString("<html></html>"))
+    assert cache.get("html") == "<html></html>"
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021 Greenbone Networks GmbH
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from unittest.mock import patch
+
+from django.template import Context
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from pheme.template_cache import compile_template, template_cache
+
+
+def test_template_is_compiled_once():
+    template_cache.clear()
+    source = "{{ name }}"
+    assert compile_template(source) is compile_template(source)
+    assert template_cache.info()["hits"] == 1
+    assert template_cache.info()["misses"] == 1
+
+
+def test_least_recently_used_template_is_removed():
+    template_cache.clear()
+    with patch.object(template_cache, "maxsize", 2):
+        first = compile_template("first")
+        compile_template("second")
+        compile_template("first")
+        compile_template("third")
+        assert compile_template("first") is first
+        assert template_cache.info()["size"] == 2
+        assert template_cache.info()["misses"] == 3
+
+
+@patch("pheme.templatetags.dynamic_template.load_params")
+def test_dynamic_template_uses_template_cache(load_params):
+    load_params.return_value = {"host_template": "{{ host }};"}
+    template_cache.clear()
+    template = compile_template(
+        "{% load dynamic_template %}"
+        "{% for host in hosts %}{{ host|dynamic_template:'host_template' }}"
+        "{% endfor %}"
+    )
+    hosts = [{"host": "host_{}".format(i)} for i in range(3)]
+    assert template.render(Context({"hosts": hosts})) == (
+        "host_0;host_1;host_2;"
+    )
+    assert template_cache.info()["misses"] == 2
+    assert template_cache.info()["hits"] == 2
+
+
+def test_metrics_contain_template_cache():
+    template_cache.clear()
+    compile_template("{{ name }}")
+    response = APIClient().get(reverse("metrics"))
+    assert response.status_code == 200
+    assert response.data["template_cache"]["misses"] == 1
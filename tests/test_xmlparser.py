@@ -20,8 +20,12 @@ from dataclasses import dataclass
 from typing import Dict
 
 import pytest
+import xmltodict
 
-from pheme.parser.xml import XMLParser
+from pheme.parser.xml import XMLParser, XMLStreamParser
+from pheme.transformation.scanreport.gvmd import transform
+
+from tests.generate_test_data import gen_report
 
 
 @dataclass
@@ -45,3 +49,43 @@ def test_parsing(xml):
     under_test = XMLParser()
     result = under_test.parse(xml.data)
     assert result == xml.expected
+
+
+@pytest.mark.parametrize(
+    "hosts",
+    [
+        ["first", "second", "third"],
+        ["first"],
+        [],
+    ],
+)
+def test_streaming_parser_equals_xmltodict(hosts):
+    report = {
+        "report": {"report": gen_report(hosts, ["oid_1", "oid_2", "oid_3"])}
+    }
+    xml = xmltodict.unparse(report)
+    expected = XMLParser().parse(xml)
+    result = XMLStreamParser().parse(xml)
+    results = result["report"]["report"]["results"]
+    streamed = list(results["result"])
+    expected_results = expected["report"]["report"]["results"].get(
+        "result", []
+    )
+    if isinstance(expected_results, dict):
+        expected_results = [expected_results]
+    assert streamed == expected_results
+    # elements after results are available after iterating the results
+    results["result"] = expected["report"]["report"]["results"].get("result")
+    if results["result"] is None:
+        del results["result"]
+    assert result == expected
+
+
+def test_streaming_transformation():
+    hosts = ["first", "second"]
+    report = {"report": {"report": gen_report(hosts, ["oid_1", "oid_2"])}}
+    xml = xmltodict.unparse(report)
+    expected = transform(XMLParser().parse(xml))
+    result = transform(XMLStreamParser().parse(xml))
+    assert result == expected
+    assert result.results[0].equipment.os == "rusty rust rust"